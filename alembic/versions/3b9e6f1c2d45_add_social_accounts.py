@@ -0,0 +1,44 @@
+"""add social accounts
+
+Revision ID: 3b9e6f1c2d45
+Revises: 8f3c1d2a6b74
+Create Date: 2026-10-18 16:11:52.840615
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b9e6f1c2d45"
+down_revision: Union[str, Sequence[str], None] = "8f3c1d2a6b74"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "social_accounts",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("provider", sa.String(length=50), nullable=False),
+        sa.Column("external_id", sa.String(length=255), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_social_accounts_provider_external_id", "social_accounts", ["provider", "external_id"], unique=True
+    )
+    op.create_index("ix_social_accounts_user_id", "social_accounts", ["user_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_social_accounts_user_id", table_name="social_accounts")
+    op.drop_index("ix_social_accounts_provider_external_id", table_name="social_accounts")
+    op.drop_table("social_accounts")
@@ -0,0 +1,47 @@
+"""add user search indexes
+
+Revision ID: 6e2a9d4b7f18
+Revises: 3b9e6f1c2d45
+Create Date: 2026-10-18 17:26:09.114382
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6e2a9d4b7f18"
+down_revision: Union[str, Sequence[str], None] = "3b9e6f1c2d45"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_COLUMNS = ("login", "email", "first_name", "last_name")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Индексы строятся CONCURRENTLY вне транзакции, чтобы не блокировать запись в users
+    with op.get_context().autocommit_block():
+        for column in TRGM_COLUMNS:
+            name = f"ix_users_{column}_trgm"
+            op.drop_index(name, table_name="users", postgresql_concurrently=True, if_exists=True)
+            op.create_index(
+                name,
+                "users",
+                [column],
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+            )
+        op.drop_index("ix_users_role_id", table_name="users", postgresql_concurrently=True, if_exists=True)
+        op.create_index("ix_users_role_id", "users", ["role_id"], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_users_role_id", table_name="users", postgresql_concurrently=True, if_exists=True)
+        for column in TRGM_COLUMNS:
+            op.drop_index(f"ix_users_{column}_trgm", table_name="users", postgresql_concurrently=True, if_exists=True)
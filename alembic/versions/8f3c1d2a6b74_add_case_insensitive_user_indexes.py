@@ -0,0 +1,42 @@
+"""add case-insensitive user indexes
+
+Revision ID: 8f3c1d2a6b74
+Revises: 5d2b8e7a9c13
+Create Date: 2026-10-18 15:02:41.306117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8f3c1d2a6b74"
+down_revision: Union[str, Sequence[str], None] = "5d2b8e7a9c13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "ix_users_email_lower": "lower(email)",
+    "ix_users_login_lower": "lower(login)",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не работает внутри транзакции и не блокирует запись в users на время построения.
+    # Если есть дубли без учёта регистра, построение упадёт: сначала python cli.py case-duplicates
+    with op.get_context().autocommit_block():
+        for name, expression in INDEXES.items():
+            # Неудачная попытка CONCURRENTLY оставляет INVALID-индекс — удаляем его перед повтором
+            op.drop_index(name, table_name="users", postgresql_concurrently=True, if_exists=True)
+            op.create_index(name, "users", [sa.text(expression)], unique=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(name, table_name="users", postgresql_concurrently=True, if_exists=True)
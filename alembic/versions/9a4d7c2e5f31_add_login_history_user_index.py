@@ -0,0 +1,33 @@
+"""add login history user index
+
+Revision ID: 9a4d7c2e5f31
+Revises: 6e2a9d4b7f18
+Create Date: 2026-10-18 18:41:52.603217
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a4d7c2e5f31"
+down_revision: Union[str, Sequence[str], None] = "6e2a9d4b7f18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX = "ix_login_history_user_id_login_time"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # login_history — самая большая таблица: индекс строится CONCURRENTLY, не блокируя запись входов
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="login_history", postgresql_concurrently=True, if_exists=True)
+        op.create_index(INDEX, "login_history", ["user_id", "login_time"], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="login_history", postgresql_concurrently=True, if_exists=True)
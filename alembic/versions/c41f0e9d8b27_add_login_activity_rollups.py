@@ -0,0 +1,64 @@
+"""add login activity rollups
+
+Revision ID: c41f0e9d8b27
+Revises: 2a32e3076638
+Create Date: 2026-10-18 10:12:31.402115
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c41f0e9d8b27"
+down_revision: Union[str, Sequence[str], None] = "2a32e3076638"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "login_activity_daily",
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("device_type", sa.String(length=50), nullable=False),
+        sa.Column("login_status", sa.String(length=20), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "day", "device_type", "login_status"),
+    )
+    op.create_table(
+        "login_activity_daily_total",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("device_type", sa.String(length=50), nullable=False),
+        sa.Column("login_status", sa.String(length=20), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("day", "device_type", "login_status"),
+    )
+    op.create_table(
+        "rollup_watermarks",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("value", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    # login_history — самая большая таблица: индекс строится CONCURRENTLY, не блокируя запись входов
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_login_history_login_time", table_name="login_history", postgresql_concurrently=True, if_exists=True
+        )
+        op.create_index("ix_login_history_login_time", "login_history", ["login_time"], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_login_history_login_time", table_name="login_history", postgresql_concurrently=True, if_exists=True
+        )
+    op.drop_table("rollup_watermarks")
+    op.drop_table("login_activity_daily_total")
+    op.drop_table("login_activity_daily")
@@ -0,0 +1,89 @@
+"""
+Бенчмарк времени импорта приложения (`python -X importtime`).
+
+Импорт `src.main` выполняется при старте каждого воркера gunicorn, поэтому он
+должен оставаться быстрым и не иметь побочных эффектов (подключения, экспортёры,
+чтение настроек). Запуск:
+
+    python -m benchmarks.import_time --top 15 --runs 5 --own-budget-ms 300
+
+Большую часть времени занимают сторонние пакеты (fastapi, sqlalchemy, redis, opentelemetry), и она
+сильно зависит от машины, поэтому бюджет задаётся на собственные модули приложения (src.*, время
+без вложенных импортов) — это то, что меняется в этом репозитории. --budget-ms ограничивает полное время.
+Берётся медиана из --runs запусков. При превышении бюджета скрипт завершается с кодом 1.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str) -> list[tuple[int, int, int, str]]:
+    """Возвращает список (depth, self_us, cumulative_us, module) из вывода -X importtime"""
+    # Пустое окружение без .env: импорт не должен требовать настроек
+    env = {"PATH": os.environ.get("PATH", ""), "PYTHONPATH": ROOT}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"Импорт {module} завершился ошибкой:\n{proc.stderr}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def own_ms(rows: list[tuple[int, int, int, str]]) -> float:
+    """Время собственных модулей приложения без вложенных импортов, мс"""
+    return sum(self_us for _, self_us, _, name in rows if name == "src" or name.startswith("src.")) / 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--top", type=int, default=15, help="сколько самых тяжёлых модулей показать")
+    parser.add_argument("--runs", type=int, default=5, help="запусков, берётся медиана")
+    parser.add_argument("--budget-ms", type=float, default=None, help="допустимое полное время импорта, мс")
+    parser.add_argument("--own-budget-ms", type=float, default=None, help="допустимое время модулей src.*, мс")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(max(args.runs, 1))]
+    totals = [next(cumulative for _, _, cumulative, name in rows if name == args.module) / 1000 for rows in runs]
+    total_ms = statistics.median(totals)
+    app_ms = statistics.median(own_ms(rows) for rows in runs)
+    # Таблица — по запуску с медианным полным временем
+    rows = runs[totals.index(sorted(totals)[len(totals) // 2])]
+
+    print(f"{args.module}: {total_ms:.1f} ms (медиана {len(runs)} запусков), из них модули src.*: {app_ms:.1f} ms")
+    print(f"{'cumulative, ms':>15} {'self, ms':>10}  module")
+    # Прямые зависимости src.main и сам src.main
+    direct = [row for row in rows if row[0] <= 1]
+    for _, self_us, cumulative_us, name in sorted(direct, key=lambda row: row[2], reverse=True)[: args.top]:
+        print(f"{cumulative_us / 1000:>15.1f} {self_us / 1000:>10.1f}  {name}")
+
+    failed = False
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Превышен бюджет импорта: {total_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        failed = True
+    if args.own_budget_ms is not None and app_ms > args.own_budget_ms:
+        print(f"Превышен бюджет модулей src.*: {app_ms:.1f} ms > {args.own_budget_ms:.1f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
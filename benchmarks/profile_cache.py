@@ -0,0 +1,78 @@
+"""
+Бенчмарк кэша профилей пользователей под распределением Ципфа.
+
+Запросы профилей идут конкурентно; загрузка из базы имитируется задержкой --db-latency-ms.
+Выводит hit ratio, число объединённых (single-flight) промахов, число обращений к «базе»
+и среднюю задержку. Нужен Redis. Запуск:
+
+    python -m benchmarks.profile_cache --redis-url redis://localhost:6379/15 --users 100000 --requests 50000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError
+
+from src.services.profile_cache import PROFILE_PREFIX, UserProfileCache
+
+
+def zipf_user_ids(users: int, requests: int, exponent: float, seed: int = 42) -> list[str]:
+    rnd = random.Random(seed)
+    weights = [1 / rank**exponent for rank in range(1, users + 1)]
+    return [f"user-{rank}" for rank in rnd.choices(range(users), weights=weights, k=requests)]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--exponent", type=float, default=1.1)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    redis = Redis.from_url(args.redis_url)
+    try:
+        await redis.ping()
+    except (ConnectionError, OSError):
+        raise SystemExit(f"Redis {args.redis_url} недоступен")
+
+    cache = UserProfileCache(ttl=300)
+    db_queries = 0
+
+    async def load(user_id: str) -> dict:
+        nonlocal db_queries
+        db_queries += 1
+        await asyncio.sleep(args.db_latency_ms / 1000)
+        return {"id": user_id, "login": user_id, "role": "user"}
+
+    user_ids = zipf_user_ids(args.users, args.requests, args.exponent)
+    queue = iter(user_ids)
+
+    async def worker() -> None:
+        for user_id in queue:
+            await cache.get(redis, user_id, lambda: load(user_id))
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        async for key in redis.scan_iter(match=PROFILE_PREFIX + "user-*", count=1000):
+            await redis.delete(key)
+        await redis.aclose()
+
+    stats = cache.stats()
+    print(f"запросов: {args.requests}, уникальных пользователей: {len(set(user_ids))}")
+    print(f"hit ratio: {stats['hit_ratio']:.1%}, объединено промахов: {stats['coalesced']}")
+    print(f"обращений к базе: {db_queries} (без кэша было бы {args.requests})")
+    latency_ms = elapsed / args.requests * args.concurrency * 1000
+    print(f"{args.requests / elapsed:.0f} запросов/с, {latency_ms:.2f} мс/запрос")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Бенчмарк горячих запросов: ORM против src.db.queries.
+
+Старый путь: select(User) собирается заново на каждый вызов, строки гидратируются в ORM-объекты
+(identity map, состояние, события загрузки). Новый путь: lambda_stmt из src.db.queries — выражение
+и ключ кэша строятся один раз, строки Core превращаются в записи со __slots__.
+База — SQLite в памяти, поэтому цифры показывают накладные расходы Python, а не сервера. Запуск:
+
+    python -m benchmarks.queries --iterations 5000 --history 50
+"""
+
+import argparse
+import time
+
+from sqlalchemy import create_engine, func, or_, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.db.queries import RoleRecord, UserRecord, login_history_stmt, role_by_name_stmt, user_by_identifier_stmt
+from src.models.user import Base, LoginHistory, Role, User
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_as_json(type_, compiler, **kw) -> str:
+    # Таблица outbox создаётся вместе с остальными, SQLite не знает JSONB
+    return "JSON"
+
+
+def orm_user_by_identifier(identifier: str):
+    normalized = func.lower(identifier.strip())
+    return select(User).where(or_(func.lower(User.email) == normalized, func.lower(User.login) == normalized))
+
+
+def bench(func, iterations: int) -> float:
+    """Среднее время одного вызова, мкс"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--history", type=int, default=50, help="записей в истории входов пользователя")
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        role = Role(name="user")
+        session.add(role)
+        session.flush()
+        # Конструктор User хэширует пароль: для бенчмарка это лишнее
+        user = User.__mapper__.class_manager.new_instance()
+        user.login, user.email, user.password = "john", "john@mail.ru", "$pbkdf2-sha256$29000$" + "a" * 64
+        user.first_name, user.last_name, user.role_id = "John", "Smith", role.id
+        session.add(user)
+        session.flush()
+        session.add_all(
+            LoginHistory(user_id=user.id, ip_address="10.0.0.1", user_agent="Mozilla/5.0", device_type="desktop")
+            for _ in range(args.history)
+        )
+        session.commit()
+        user_id = user.id
+
+    with Session(engine) as session:
+        connection = session.connection()
+
+        def user_before():
+            user = session.execute(orm_user_by_identifier("John@mail.ru")).scalar_one_or_none()
+            # Без этого identity map вернёт уже загруженный объект и гидратации не будет
+            session.expunge_all()
+            return user
+
+        def user_after():
+            row = connection.execute(user_by_identifier_stmt("John@mail.ru")).first()
+            return UserRecord(*row)
+
+        def role_before():
+            role = session.execute(select(Role).filter(Role.name == "user")).scalar_one()
+            session.expunge_all()
+            return role
+
+        def role_after():
+            return RoleRecord(*connection.execute(role_by_name_stmt("user")).first())
+
+        def history_before():
+            history = session.execute(select(LoginHistory).where(LoginHistory.user_id == user_id)).scalars().all()
+            session.expunge_all()
+            return history
+
+        def history_after():
+            return connection.execute(login_history_stmt(user_id)).all()
+
+        assert user_before().id == user_after().id
+        assert len(history_before()) == len(history_after()) == args.history
+
+        for title, before, after, iterations in (
+            (
+                "построение select по email/логину",
+                lambda: orm_user_by_identifier("x"),
+                lambda: user_by_identifier_stmt("x"),
+                args.iterations,
+            ),
+            ("пользователь по email/логину", user_before, user_after, args.iterations),
+            ("роль по имени", role_before, role_after, args.iterations),
+            (f"история входов ({args.history} записей)", history_before, history_after, max(args.iterations // 10, 1)),
+        ):
+            before_us = bench(before, iterations)
+            after_us = bench(after, iterations)
+            print(f"{title}: {before_us:.1f} мкс -> {after_us:.1f} мкс на вызов (x{before_us / after_us:.1f})")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
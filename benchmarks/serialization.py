@@ -0,0 +1,103 @@
+"""
+Бенчмарк сериализации ответов `/auth` и `/login_history`.
+
+Старый путь: UserSchema.from_orm + AuthResponse, затем валидация по response_model
+и dump в JSON-совместимые типы (как делает FastAPI), затем orjson.
+Новый путь: сериализаторы из src.schemas.serializers и сразу orjson. Запуск:
+
+    python -m benchmarks.serialization --iterations 20000 --history 50
+"""
+
+import argparse
+import time
+import uuid
+from datetime import datetime
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy.orm import configure_mappers
+
+from src.models.user import LoginHistory, User
+from src.schemas.login_history import LoginHistoryResponseSchema
+from src.schemas.serializers import serialize, serialize_many
+from src.schemas.users import AuthResponse, TokenSchema, UserSchema
+
+TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9." + "x" * 300
+
+
+def make_user() -> User:
+    # Конструктор User хэширует пароль, поэтому собираем объект в обход него
+    user = User.__mapper__.class_manager.new_instance()
+    user.id = uuid.uuid4()
+    user.login = "john"
+    user.email = "john@mail.ru"
+    user.password = "$pbkdf2-sha256$29000$" + "a" * 64
+    user.first_name = "John"
+    user.last_name = "Smith"
+    user.role_id = uuid.uuid4()
+    user.created_at = datetime.utcnow()
+    return user
+
+
+def make_history(user_id: uuid.UUID, size: int) -> list[LoginHistory]:
+    return [
+        LoginHistory(user_id=user_id, ip_address="10.0.0.1", user_agent="Mozilla/5.0", device_type="desktop")
+        for _ in range(size)
+    ]
+
+
+def bench(func, iterations: int) -> float:
+    """Среднее время одного ответа, мкс"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--history", type=int, default=50, help="записей в ответе /login_history")
+    args = parser.parse_args()
+
+    configure_mappers()
+    user = make_user()
+    history = make_history(user.id, args.history)
+    for row in history:
+        row.id = uuid.uuid4()
+
+    auth_adapter = TypeAdapter(AuthResponse)
+    history_adapter = TypeAdapter(list[LoginHistoryResponseSchema])
+
+    def auth_before() -> bytes:
+        response = AuthResponse(
+            token=TokenSchema(access_token=TOKEN, refresh_token=TOKEN), user=UserSchema.model_validate(user)
+        )
+        validated = auth_adapter.validate_python(response, from_attributes=True)
+        return orjson.dumps(auth_adapter.dump_python(validated, mode="json"))
+
+    def auth_after() -> bytes:
+        token = {"access_token": TOKEN, "refresh_token": TOKEN}
+        return orjson.dumps({"token": token, "user": serialize(UserSchema, user)})
+
+    def history_before() -> bytes:
+        validated = history_adapter.validate_python(history, from_attributes=True)
+        return orjson.dumps(history_adapter.dump_python(validated, mode="json"))
+
+    def history_after() -> bytes:
+        return orjson.dumps(serialize_many(LoginHistoryResponseSchema, history))
+
+    assert orjson.loads(auth_before()) == orjson.loads(auth_after())
+    assert orjson.loads(history_before()) == orjson.loads(history_after())
+
+    for title, before, after, iterations in (
+        ("/auth", auth_before, auth_after, args.iterations),
+        (f"/login_history ({args.history} записей)", history_before, history_after, max(args.iterations // 10, 1)),
+    ):
+        before_us = bench(before, iterations)
+        after_us = bench(after, iterations)
+        print(f"{title}: {before_us:.1f} мкс -> {after_us:.1f} мкс на ответ (x{before_us / after_us:.1f})")
+
+
+if __name__ == "__main__":
+    main()
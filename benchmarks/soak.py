@@ -0,0 +1,354 @@
+"""
+Soak-тест: часы смешанного трафика с контролем утечек памяти и соединений.
+
+Виртуальные пользователи по кругу проходят /signup, /auth, /login_history, /update и /logout.
+Каждые --sample-seconds снимаются RSS, число соединений с PostgreSQL (pg_stat_activity) и Redis
+(INFO clients), лаг event loop и счётчики запросов. После разогрева (--warmup-minutes) фиксируется
+базовый уровень; в конце сравниваются медианы первых и последних замеров, и при росте сверх
+порогов скрипт завершается с кодом 1.
+
+По умолчанию приложение запускается в этом же процессе (uvicorn в отдельном потоке): тогда
+дополнительно выводятся места с наибольшим ростом аллокаций по tracemalloc. Клиент и приложение при этом
+делят GIL, поэтому лаг event loop завышен — пороги по лагу надёжнее проверять в режиме --base-url.
+Нужны PostgreSQL и Redis из .env. Запуск:
+
+    python -m benchmarks.soak --duration-minutes 180 --users 50 --output soak.csv
+
+Против уже запущенного стека (RSS — сумма по мастеру gunicorn и его воркерам, лаг — из /metrics):
+
+    python -m benchmarks.soak --base-url http://localhost:8000 --pid $(pgrep -o gunicorn)
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import random
+import re
+import statistics
+import threading
+import time
+import tracemalloc
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import aiohttp
+import asyncpg
+from redis.asyncio import Redis
+
+from src.core.config import get_settings
+from src.db.postgres import build_dsn
+
+# Сколько замеров в начале и в конце усредняется медианой: единичный всплеск не считается утечкой
+WINDOW = 3
+
+
+@dataclass
+class Sample:
+    elapsed_s: float
+    rss_mb: float
+    traced_mb: float
+    db_connections: int
+    redis_clients: int
+    loop_lag_ms: float
+    requests: int
+    errors: int
+    shed: int
+
+
+class Traffic:
+    """Смешанный трафик виртуальных пользователей и счётчики ответов"""
+
+    def __init__(self, base_url: str, signup_every: int):
+        self.base_url = base_url
+        self.signup_every = signup_every
+        self.requests = 0
+        self.errors = 0
+        self.shed = 0
+
+    async def _call(self, session: aiohttp.ClientSession, method: str, path: str, **kwargs) -> Optional[dict]:
+        self.requests += 1
+        try:
+            async with session.request(method, self.base_url + path, **kwargs) as response:
+                body = await response.read()
+                if response.status == 503:
+                    self.shed += 1
+                    return None
+                if response.status >= 400:
+                    self.errors += 1
+                    return None
+                return await response.json() if body else {}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            self.errors += 1
+            return None
+
+    async def _signup(self, session: aiohttp.ClientSession) -> tuple[str, str]:
+        login = f"soak_{uuid.uuid4().hex[:12]}"
+        password = uuid.uuid4().hex
+        await self._call(
+            session,
+            "POST",
+            "/signup",
+            json={
+                "login": login,
+                "email": f"{login}@soak.test",
+                "password": password,
+                "password_again": password,
+                "first_name": "soak",
+                "last_name": "test",
+            },
+        )
+        return login, password
+
+    async def virtual_user(self, session: aiohttp.ClientSession, deadline: float) -> None:
+        login, password = await self._signup(session)
+        cycles = 0
+        while time.monotonic() < deadline:
+            cycles += 1
+            if cycles % self.signup_every == 0:
+                login, password = await self._signup(session)
+            auth = await self._call(session, "POST", "/auth", json={"email": login, "password": password})
+            if auth is None:
+                await asyncio.sleep(1)
+                continue
+            user_id = auth["user"]["id"]
+            headers = {"Authorization": f"Bearer {auth['token']['access_token']}"}
+            for _ in range(random.randint(1, 5)):
+                await self._call(session, "GET", f"/{user_id}/login_history", headers=headers)
+            if random.random() < 0.3:
+                new_login, new_password = f"soak_{uuid.uuid4().hex[:12]}", uuid.uuid4().hex
+                updated = await self._call(
+                    session,
+                    "PATCH",
+                    f"/{user_id}/update",
+                    headers=headers,
+                    json={"new_login": new_login, "new_password": new_password},
+                )
+                if updated is not None:
+                    login, password = new_login, new_password
+            await self._call(session, "POST", f"/{user_id}/logout", headers=headers)
+
+
+def rss_mb(pid: int, with_children: bool) -> float:
+    """RSS процесса (и его потомков) из /proc"""
+    pids = [pid]
+    if with_children:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            try:
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+            except FileNotFoundError:
+                continue
+    total_kb = 0
+    for each in pids:
+        try:
+            with open(f"/proc/{each}/status") as f:
+                total_kb += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (FileNotFoundError, StopIteration):
+            continue
+    return total_kb / 1024
+
+
+async def scrape_loop_lag(session: aiohttp.ClientSession, base_url: str) -> float:
+    async with session.get(base_url + "/metrics") as response:
+        text = await response.text()
+    values = [float(value) for value in re.findall(r"^event_loop_lag_seconds(?:\{[^}]*\})? (\S+)$", text, re.M)]
+    return max(values, default=0.0)
+
+
+class Sampler:
+    def __init__(self, args: argparse.Namespace, in_process: bool):
+        self.args = args
+        self.in_process = in_process
+        self.samples: list[Sample] = []
+        self.started = time.monotonic()
+
+    async def sample(self, session: aiohttp.ClientSession, traffic: Traffic, db, redis: Redis) -> Sample:
+        if self.in_process:
+            from src.core.admission import load_signals
+
+            rss = rss_mb(os.getpid(), with_children=False)
+            loop_lag = load_signals.loop_lag
+        else:
+            rss = rss_mb(self.args.pid, with_children=True) if self.args.pid else 0.0
+            loop_lag = await scrape_loop_lag(session, self.args.base_url)
+        db_connections = await db.fetchval(
+            "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()"
+        )
+        # Минус соединение самого сэмплера
+        redis_clients = (await redis.info("clients"))["connected_clients"] - 1
+        sample = Sample(
+            elapsed_s=round(time.monotonic() - self.started, 1),
+            rss_mb=round(rss, 1),
+            traced_mb=round(tracemalloc.get_traced_memory()[0] / 2**20, 1) if tracemalloc.is_tracing() else 0.0,
+            db_connections=db_connections,
+            redis_clients=redis_clients,
+            loop_lag_ms=round(loop_lag * 1000, 2),
+            requests=traffic.requests,
+            errors=traffic.errors,
+            shed=traffic.shed,
+        )
+        self.samples.append(sample)
+        print(" ".join(f"{key}={value}" for key, value in asdict(sample).items()), flush=True)
+        return sample
+
+
+def growth(samples: list[Sample], field: str) -> float:
+    first = statistics.median(getattr(sample, field) for sample in samples[:WINDOW])
+    last = statistics.median(getattr(sample, field) for sample in samples[-WINDOW:])
+    return last - first
+
+
+def check_thresholds(samples: list[Sample], args: argparse.Namespace) -> list[str]:
+    """Нарушенные пороги по замерам после разогрева"""
+    if len(samples) < 2 * WINDOW:
+        return [f"слишком мало замеров после разогрева: {len(samples)}, нужно не меньше {2 * WINDOW}"]
+    checks = (
+        ("rss_mb", args.max_rss_growth_mb, "рост RSS, МБ"),
+        ("traced_mb", args.max_traced_growth_mb, "рост памяти по tracemalloc, МБ"),
+        ("db_connections", args.max_db_connections_growth, "рост соединений с PostgreSQL"),
+        ("redis_clients", args.max_redis_clients_growth, "рост соединений с Redis"),
+    )
+    failures = []
+    for field, limit, title in checks:
+        value = growth(samples, field)
+        print(f"{title}: {value:+.1f} (порог {limit})")
+        if value > limit:
+            failures.append(f"{title}: {value:+.1f} > {limit}")
+    max_lag = max(sample.loop_lag_ms for sample in samples)
+    print(f"максимальный лаг event loop: {max_lag:.1f} мс (порог {args.max_loop_lag_ms})")
+    if max_lag > args.max_loop_lag_ms:
+        failures.append(f"лаг event loop {max_lag:.1f} мс > {args.max_loop_lag_ms}")
+    requests = samples[-1].requests - samples[0].requests
+    errors = samples[-1].errors - samples[0].errors
+    error_rate = errors / requests if requests else 1.0
+    print(f"запросов: {requests}, ошибок: {error_rate:.2%}, отброшено admission control: {samples[-1].shed}")
+    if error_rate > args.max_error_rate:
+        failures.append(f"доля ошибок {error_rate:.2%} > {args.max_error_rate:.2%}")
+    return failures
+
+
+def print_top_allocations(baseline: tracemalloc.Snapshot, top: int) -> None:
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+    )
+    print(f"\nнаибольший рост аллокаций с конца разогрева (top {top}):")
+    for stat in snapshot.compare_to(baseline, "lineno")[:top]:
+        print(f"  {stat.size_diff / 1024:+10.1f} КБ {stat.count_diff:+8d} блоков  {stat.traceback}")
+
+
+def start_server(port: int):
+    """uvicorn с приложением в отдельном потоке со своим event loop"""
+    import uvicorn
+
+    from src.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="soak-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit("Приложение не запустилось")
+        time.sleep(0.1)
+    return server, thread
+
+
+async def wait_ready(session: aiohttp.ClientSession, base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(base_url + "/ready") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise SystemExit(f"{base_url}/ready не ответил 200 за {timeout:.0f} с")
+
+
+async def run(args: argparse.Namespace, in_process: bool) -> list[str]:
+    settings = get_settings()
+    db = await asyncpg.connect(build_dsn(settings, driver="postgresql"))
+    redis = Redis(host=settings.redis_host, port=settings.redis_port)
+    traffic = Traffic(args.base_url, args.signup_every)
+    sampler = Sampler(args, in_process)
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit=args.users)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await wait_ready(session, args.base_url, timeout=60)
+            started = time.monotonic()
+            deadline = started + args.duration_minutes * 60
+            users = [asyncio.create_task(traffic.virtual_user(session, deadline)) for _ in range(args.users)]
+
+            baseline = None
+            await asyncio.sleep(args.warmup_minutes * 60)
+            if in_process:
+                tracemalloc.start(args.tracemalloc_frames)
+                baseline = tracemalloc.take_snapshot()
+            print("разогрев завершён, базовый уровень зафиксирован", flush=True)
+            sampler.samples.clear()
+            while time.monotonic() < deadline:
+                await sampler.sample(session, traffic, db, redis)
+                await asyncio.sleep(min(args.sample_seconds, max(deadline - time.monotonic(), 0)))
+            await asyncio.gather(*users)
+            # Последний замер — после того, как трафик остановился и соединения вернулись в пулы
+            await asyncio.sleep(args.sample_seconds)
+            await sampler.sample(session, traffic, db, redis)
+            if baseline is not None:
+                print_top_allocations(baseline, args.top)
+    finally:
+        await db.close()
+        await redis.aclose()
+
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(Sample.__dataclass_fields__))
+            writer.writeheader()
+            writer.writerows(asdict(sample) for sample in sampler.samples)
+    print()
+    return check_thresholds(sampler.samples, args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Уже запущенный стек; без него приложение стартует в этом процессе")
+    parser.add_argument("--pid", type=int, help="PID мастера gunicorn для замера RSS (вместе с воркерами)")
+    parser.add_argument("--port", type=int, default=8765, help="Порт приложения в этом процессе")
+    parser.add_argument("--duration-minutes", type=float, default=180)
+    parser.add_argument("--warmup-minutes", type=float, default=5)
+    parser.add_argument("--sample-seconds", type=float, default=30)
+    parser.add_argument("--users", type=int, default=50, help="Одновременных виртуальных пользователей")
+    parser.add_argument("--signup-every", type=int, default=20, help="Новая регистрация раз в столько циклов")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64)
+    parser.add_argument("--max-traced-growth-mb", type=float, default=32)
+    parser.add_argument("--max-db-connections-growth", type=float, default=2)
+    parser.add_argument("--max-redis-clients-growth", type=float, default=2)
+    parser.add_argument("--max-loop-lag-ms", type=float, default=200)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--tracemalloc-frames", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Сколько мест роста аллокаций показать")
+    parser.add_argument("--output", help="CSV с замерами")
+    args = parser.parse_args()
+
+    in_process = args.base_url is None
+    server = thread = None
+    if in_process:
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        server, thread = start_server(args.port)
+    try:
+        failures = asyncio.run(run(args, in_process))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=60)
+
+    if failures:
+        print("\nSOAK FAILED:\n  " + "\n  ".join(failures))
+        raise SystemExit(1)
+    print("\nSOAK OK")
+
+
+if __name__ == "__main__":
+    main()
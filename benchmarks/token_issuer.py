@@ -0,0 +1,59 @@
+"""
+Бенчмарк выпуска JWT: AuthJWT.create_access_token против TokenIssuer.
+
+Выводит токенов в секунду и задержку на токен. Токены TokenIssuer проверяются
+JWTBearer.parse_token, набор claims сверяется с токенами AuthJWT. Запуск:
+
+    YANDEX_CLIENT_ID=x YANDEX_CLIENT_SECRET=x python -m benchmarks.token_issuer --tokens 20000
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from async_fastapi_jwt_auth import AuthJWT
+
+from src.core.config import get_settings
+from src.services.token import ACCESS_TOKEN_EXPIRES, JWTBearer
+from src.services.token_issuer import get_token_issuer
+
+
+def report(title: str, elapsed: float, tokens: int) -> None:
+    print(f"{title:<32} {tokens / elapsed:>10.0f} токенов/с  {elapsed / tokens * 1_000_000:>7.1f} мкс/токен")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20000)
+    args = parser.parse_args()
+
+    AuthJWT.load_config(get_settings)
+    authorize = AuthJWT()
+    issuer = get_token_issuer()
+    user_id = str(uuid.uuid4())
+    claims = {"user_id": user_id, "is_active": True, "token_type": "access", "role": "user"}
+
+    reference = JWTBearer.parse_token(
+        await authorize.create_access_token(subject=user_id, user_claims=claims, expires_time=ACCESS_TOKEN_EXPIRES)
+    )
+    issued = JWTBearer.parse_token(
+        issuer.issue(subject=user_id, token_type="access", expires_time=ACCESS_TOKEN_EXPIRES, user_claims=claims)
+    )
+    # iat_ms TokenIssuer добавляет сверх набора AuthJWT (сравнение со сменой роли)
+    if issued is None or issued.keys() - {"iat_ms"} != reference.keys():
+        raise SystemExit(f"Токен TokenIssuer не совпадает с AuthJWT: {issued} != {reference}")
+
+    started = time.perf_counter()
+    for _ in range(args.tokens):
+        await authorize.create_access_token(subject=user_id, user_claims=claims, expires_time=ACCESS_TOKEN_EXPIRES)
+    report("AuthJWT.create_access_token", time.perf_counter() - started, args.tokens)
+
+    started = time.perf_counter()
+    for _ in range(args.tokens):
+        issuer.issue(subject=user_id, token_type="access", expires_time=ACCESS_TOKEN_EXPIRES, user_claims=claims)
+    report("TokenIssuer.issue", time.perf_counter() - started, args.tokens)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
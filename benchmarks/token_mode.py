@@ -0,0 +1,94 @@
+"""
+Бенчмарк режимов токенов: JWT против opaque (сессия в Redis).
+
+Сравнивает размер заголовка Authorization и стоимость проверки токена на запрос:
+JWT — проверка подписи + EXISTS в блэклисте, opaque — один HGETALL.
+Для сетевой части нужен Redis. Запуск:
+
+    python -m benchmarks.token_mode --redis-url redis://localhost:6379/15 --iterations 5000
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import jwt
+from async_fastapi_jwt_auth import AuthJWT
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError
+
+from src.services.opaque_token import SESSION_PREFIX, issue_opaque_token, resolve_opaque_token
+from src.services.revocation import BLACKLIST_PREFIX
+from src.services.token import ACCESS_TOKEN_EXPIRES
+
+SECRET = "benchmark-secret-key-minimum-32-characters"
+
+
+async def make_jwt(user_id: str) -> str:
+    AuthJWT.load_config(lambda: [("authjwt_secret_key", SECRET), ("authjwt_algorithm", "HS256")])
+    claims = {"user_id": user_id, "is_active": True, "token_type": "access", "role": "user"}
+    return await AuthJWT().create_access_token(subject=user_id, user_claims=claims, expires_time=ACCESS_TOKEN_EXPIRES)
+
+
+async def timed(coro_factory, iterations: int) -> float:
+    """Среднее время одной проверки, мкс"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await coro_factory()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    user_id = str(uuid.uuid4())
+    jwt_token = await make_jwt(user_id)
+    opaque_token = "x" * 32  # длина secrets.token_urlsafe(24)
+
+    print("Байт в заголовке Authorization:")
+    print(f"  JWT:    {len('Authorization: Bearer ' + jwt_token)}")
+    print(f"  opaque: {len('Authorization: Bearer ' + opaque_token)}")
+
+    def decode() -> dict:
+        return jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
+
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        decode()
+    decode_us = (time.perf_counter() - started) / args.iterations * 1_000_000
+    print(f"Проверка подписи JWT (CPU): {decode_us:.1f} мкс")
+
+    redis = Redis.from_url(args.redis_url, decode_responses=True)
+    try:
+        await redis.ping()
+    except (ConnectionError, OSError):
+        print(f"Redis {args.redis_url} недоступен — сетевая часть пропущена")
+        return
+
+    try:
+        claims = {"sub": user_id, "user_id": user_id, "is_active": True, "token_type": "access", "role": "user"}
+        opaque_token = await issue_opaque_token(redis, claims, ACCESS_TOKEN_EXPIRES)
+
+        async def verify_jwt() -> None:
+            payload = decode()
+            await redis.exists(BLACKLIST_PREFIX + payload["jti"])
+
+        async def verify_opaque() -> None:
+            await resolve_opaque_token(redis, opaque_token)
+
+        jwt_us = await timed(verify_jwt, args.iterations)
+        opaque_us = await timed(verify_opaque, args.iterations)
+        print("Проверка токена на запрос (с обращением к Redis):")
+        print(f"  JWT (decode + EXISTS): {jwt_us:.1f} мкс")
+        print(f"  opaque (HGETALL):      {opaque_us:.1f} мкс")
+    finally:
+        await redis.delete(SESSION_PREFIX + opaque_token)
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
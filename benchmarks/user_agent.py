@@ -0,0 +1,103 @@
+"""
+Бенчмарк определения типа устройства по User-Agent.
+
+Сравнивает стоимость одного логина для полного разбора `user_agents.parse`
+(как было раньше в LoginHistoryService) и для UserAgentClassifier с LRU-кэшем
+и быстрым путём. Корпус — несколько сотен различных UA, запросы распределены
+по Ципфу, как в реальном трафике. Запуск:
+
+    python -m benchmarks.user_agent --requests 20000
+"""
+
+import argparse
+import random
+import time
+
+from src.services.user_agent import UserAgentClassifier, parse_device_type
+
+TEMPLATES = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 "
+    "Safari/537.36 Edg/{v}.0.0.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 "
+    "Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:{v}.0) Gecko/20100101 Firefox/{v}.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{m} "
+    "Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_{m} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/17.{m} Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (iPad; CPU OS 17_{m} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{m} "
+    "Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 13; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 "
+    "Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 12; SM-X200) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 "
+    "YaBrowser/24.{m}.0.0 Safari/537.36",
+    "Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "okhttp/4.{m}.0",
+    "python-requests/2.{v}.0",
+)
+
+
+def build_corpus() -> list[str]:
+    corpus = []
+    for template in TEMPLATES:
+        for v in range(100, 125):
+            for m in range(0, 6):
+                corpus.append(template.format(v=v, m=m))
+    # Убираем дубли (шаблоны без {m}/{v}), сохраняя порядок
+    return list(dict.fromkeys(corpus))
+
+
+def zipf_sample(corpus: list[str], size: int, seed: int = 42) -> list[str]:
+    rnd = random.Random(seed)
+    population = corpus[:]
+    rnd.shuffle(population)
+    weights = [1 / rank for rank in range(1, len(population) + 1)]
+    return rnd.choices(population, weights=weights, k=size)
+
+
+def bench(func, sample: list[str]) -> float:
+    """Среднее время одного вызова, мкс"""
+    started = time.perf_counter()
+    for user_agent in sample:
+        func(user_agent)
+    return (time.perf_counter() - started) / len(sample) * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    sample = zipf_sample(corpus, args.requests)
+    print(f"корпус: {len(corpus)} различных UA, запросов: {len(sample)}, уникальных в выборке: {len(set(sample))}")
+
+    # Быстрый путь обязан давать тот же результат, что и полный разбор
+    fast_only = UserAgentClassifier(maxsize=0)
+    mismatches = [ua for ua in corpus if fast_only.classify(ua) != parse_device_type(ua)]
+    if mismatches:
+        raise SystemExit(f"Быстрый путь расходится с user_agents на {len(mismatches)} UA, например: {mismatches[0]}")
+
+    parse_device_type(corpus[0])  # прогрев импорта user_agents
+    baseline = bench(parse_device_type, sample)
+    print(f"user_agents.parse:               {baseline:8.2f} мкс/логин")
+
+    for title, fast_path in (("LRU-кэш", False), ("LRU-кэш + быстрый путь", True)):
+        classifier = UserAgentClassifier(maxsize=args.cache_size, fast_path=fast_path)
+        per_call = bench(classifier.classify, sample)
+        stats = classifier.stats()
+        print(
+            f"{title + ':':<32} {per_call:8.2f} мкс/логин  (x{baseline / per_call:.0f}, "
+            f"hit rate {stats['hit_rate']:.1%}, fast path {stats['fast_path_hits']})"
+        )
+
+
+if __name__ == "__main__":
+    main()
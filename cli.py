@@ -1,12 +1,36 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+
 import typer
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
-from src.db.postgres import get_session_for_cli
+from exceptions import AccountNotFound
+from src.core.config import get_settings
+from src.db import postgres
+from src.db.postgres import get_session_for_cli, init_sync_engine
 from src.models.user import Role, User
+from src.services.client_credentials import ClientCredentialsService
+from src.services.login_activity import refresh_login_activity_rollup
+from src.services.outbox import run_outbox_relay
+from src.services.role_assignment import RoleAssignmentService
+from src.services.user_deletion import UserDeletionService
+from src.services.user import find_case_duplicates, lowercase_emails
 
 
 app = typer.Typer()
 
 
+@app.callback()
+def main():
+    """Синхронный движок psycopg2 создаётся только для команд CLI"""
+    init_sync_engine(get_settings())
+
+
 def create_role_superuser():
     """Создать роль суперпользователя"""
     with get_session_for_cli() as db:
@@ -54,6 +78,188 @@ def init_superuser():
     init_superuser_data()
 
 
+@app.command()
+def rollup_login_activity(
+    lag_seconds: int = typer.Option(60, help="Не трогать входы моложе этого значения"),
+    window_hours: int = typer.Option(24, help="Размер окна одной транзакции"),
+):
+    """Дописать новые записи login_history в суточные rollup-таблицы (запускать периодически)"""
+    with get_session_for_cli() as db:
+        processed = refresh_login_activity_rollup(
+            db, lag=timedelta(seconds=lag_seconds), window=timedelta(hours=window_hours)
+        )
+    print(f"Учтено записей истории входов: {processed}")
+
+
+@app.command()
+def outbox_relay(once: bool = typer.Option(False, help="Опубликовать накопившиеся события и выйти")):
+    """Публиковать события outbox в Redis Stream (долгоживущий процесс)"""
+    settings = get_settings()
+    redis = Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    with get_session_for_cli() as db:
+        run_outbox_relay(db, redis, settings, once=once)
+
+
+@app.command()
+def case_duplicates(
+    normalize_emails: bool = typer.Option(False, help="Привести email к нижнему регистру, где это не создаёт дублей"),
+    batch_size: int = typer.Option(1000, help="Размер пачки при нормализации"),
+):
+    """Отчёт о логинах и email, совпадающих без учёта регистра (запускать до миграции 8f3c1d2a6b74)"""
+    with get_session_for_cli() as db:
+        if normalize_emails:
+            print(f"Нормализовано email: {lowercase_emails(db, batch_size)}")
+        report = find_case_duplicates(db)
+        for name, groups in report.items():
+            for users in groups:
+                print(f"{name} {getattr(users[0], name).lower()}:")
+                for user in users:
+                    print(f"    {user.id} login={user.login} email={user.email} created_at={user.created_at}")
+    duplicates = sum(len(groups) for groups in report.values())
+    print(f"Групп дублей: {duplicates}")
+    if duplicates:
+        raise typer.Exit(code=1)
+
+
+@asynccontextmanager
+async def _async_resources():
+    """Async-движок и клиент Redis для команд, которые переиспользуют async-сервисы приложения"""
+    settings = get_settings()
+    postgres.init_engine(settings)
+    redis = AsyncRedis(host=settings.redis_host, port=settings.redis_port, db=0)
+    try:
+        yield redis
+    finally:
+        await redis.aclose()
+        await postgres.close_engine()
+
+
+async def _assign_role(
+    role: str, user_ids: Optional[list[str]], query: Optional[str], from_role: Optional[str], chunk_size: int
+):
+    async with _async_resources() as redis:
+        async with postgres.async_session() as db:
+            return await RoleAssignmentService(db).reassign(
+                redis,
+                role,
+                chunk_size,
+                user_ids=user_ids,
+                query=query,
+                from_role=from_role,
+                progress=lambda report: print(
+                    f"Пачка {report['chunks']}: найдено {report['matched']}, изменено {report['updated']}"
+                ),
+            )
+
+
+@app.command()
+def assign_role(
+    role: str = typer.Argument(..., help="Новая роль"),
+    ids_file: Optional[Path] = typer.Option(None, help="Файл с id пользователей, по одному в строке"),
+    query: Optional[str] = typer.Option(None, help="Подстрока логина, email или имени"),
+    from_role: Optional[str] = typer.Option(None, help="Только пользователи с этой ролью"),
+    chunk_size: int = typer.Option(0, help="Пользователей в одной транзакции (0 — из настроек)"),
+):
+    """Массово назначить роль пользователям из файла или по фильтру"""
+    if ids_file is None and not query and not from_role:
+        raise typer.BadParameter("Укажите --ids-file, --query или --from-role")
+    user_ids = None
+    if ids_file is not None:
+        user_ids = [line.strip() for line in ids_file.read_text().splitlines() if line.strip()]
+    report = asyncio.run(
+        _assign_role(role, user_ids, query, from_role, chunk_size or get_settings().role_assignment_chunk_size)
+    )
+    print(f"Роль {report['role']}: найдено {report['matched']}, изменено {report['updated']}")
+    if report["not_invalidated"]:
+        print(f"Не удалось сбросить кэш для {report['not_invalidated']} пользователей")
+
+
+async def _delete_users(user_ids: list[uuid.UUID], batch_size: int) -> None:
+    async with _async_resources() as redis:
+        for user_id in user_ids:
+            async with postgres.async_session() as db:
+                service = UserDeletionService(db)
+                try:
+                    await service.lock_out(redis, user_id)
+                except AccountNotFound:
+                    print(f"{user_id}: пользователь не найден")
+                    continue
+                await service.purge(user_id, batch_size)
+            print(f"{user_id}: удалён")
+
+
+@app.command()
+def delete_users(
+    user_ids: list[uuid.UUID] = typer.Argument(..., help="id пользователей"),
+    batch_size: int = typer.Option(0, help="Строк истории входов в одной транзакции (0 — из настроек)"),
+):
+    """Удалить аккаунты целиком: отозвать токены, удалить историю входов пачками, затем пользователя"""
+    asyncio.run(_delete_users(user_ids, batch_size or get_settings().user_deletion_batch_size))
+
+
+async def _create_client(name: str, scopes: list[str]):
+    async with _async_resources():
+        async with postgres.async_session() as db:
+            return await ClientCredentialsService(db).create_client(name, scopes)
+
+
+@app.command()
+def create_client(
+    name: str = typer.Argument(..., help="Название сервиса"),
+    scope: list[str] = typer.Option([], help="Разрешённый scope, можно указать несколько раз"),
+):
+    """Зарегистрировать сервис для получения токенов по client credentials"""
+    client, client_secret = asyncio.run(_create_client(name, scope))
+    print(f"client_id: {client.client_id}")
+    print(f"client_secret: {client_secret}")
+    print("Секрет показывается один раз, в базе хранится только его хэш")
+
+
+async def _list_clients():
+    async with _async_resources():
+        async with postgres.async_session() as db:
+            return await ClientCredentialsService(db).list_clients()
+
+
+@app.command()
+def list_clients():
+    """Зарегистрированные сервисы и их scope"""
+    for client in asyncio.run(_list_clients()):
+        state = "active" if client.is_active else "disabled"
+        print(f"{client.client_id} {state} name={client.name} scopes={client.scopes!r} created_at={client.created_at}")
+
+
+async def _rotate_client_secret(client_id: str):
+    async with _async_resources() as redis:
+        async with postgres.async_session() as db:
+            return await ClientCredentialsService(db).rotate_secret(redis, client_id)
+
+
+@app.command()
+def rotate_client_secret(client_id: str = typer.Argument(..., help="client_id сервиса")):
+    """Выдать сервису новый секрет (выданные токены действуют до истечения)"""
+    client_secret = asyncio.run(_rotate_client_secret(client_id))
+    if client_secret is None:
+        print(f"{client_id}: клиент не найден")
+        raise typer.Exit(code=1)
+    print(f"client_secret: {client_secret}")
+
+
+async def _disable_client(client_id: str):
+    async with _async_resources() as redis:
+        async with postgres.async_session() as db:
+            return await ClientCredentialsService(db).disable_client(redis, get_settings(), client_id)
+
+
+@app.command()
+def disable_client(client_id: str = typer.Argument(..., help="client_id сервиса")):
+    """Выключить сервис и отозвать его токены"""
+    if not asyncio.run(_disable_client(client_id)):
+        print(f"{client_id}: клиент не найден")
+        raise typer.Exit(code=1)
+    print(f"{client_id}: выключен, токены отозваны")
+
+
 @app.command()
 def version():
     """Показать версию приложения"""
@@ -6,4 +6,9 @@ poetry run python cli.py init-superuser
 
 cd /app
 
-poetry run gunicorn -w 4 -k uvicorn_worker.UvicornWorker src.main:app --bind 0.0.0.0:8001
\ No newline at end of file
+# Общий каталог метрик воркеров gunicorn, очищается при каждом старте
+export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus_multiproc
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+poetry run gunicorn -w 4 -k uvicorn_worker.UvicornWorker src.main:app --bind 0.0.0.0:8001 --graceful-timeout 30
\ No newline at end of file
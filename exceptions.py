@@ -8,3 +8,27 @@ class UserInDB(Exception):
 
 class AuthException(Exception):
     detail = "This operation is forbidden for you"
+
+
+class OAuthStateInvalid(Exception):
+    detail = "Сессия входа через провайдера истекла или недействительна"
+
+
+class OAuthProviderError(Exception):
+    detail = "Провайдер авторизации недоступен или отклонил запрос"
+
+
+class RoleNotFound(Exception):
+    detail = "Роль не найдена"
+
+
+class AccountNotFound(Exception):
+    detail = "Пользователь не найден"
+
+
+class InvalidClient(Exception):
+    detail = "Неверный client_id или client_secret"
+
+
+class InvalidScope(Exception):
+    detail = "Запрошенный scope не разрешён клиенту"
@@ -0,0 +1,6 @@
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Иначе gauge умершего воркера (соединения пула) продолжают суммироваться в /metrics
+    multiprocess.mark_process_dead(worker.pid)
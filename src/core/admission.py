@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import orjson
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.core.config import Settings, get_settings
+from src.core.metrics import EVENT_LOOP_LAG, count_shed
+
+# Классы приоритета: меньше — важнее
+HIGH = 0
+LOW = 1
+
+# Коэффициент экспоненциального сглаживания сигналов перегрузки
+SMOOTHING = 0.2
+
+# Сколько пар (метод, путь) помнить в кэше шаблонов маршрутов
+ROUTE_CACHE_SIZE = 1024
+
+
+class LoadSignals:
+    """Сглаженные сигналы перегрузки воркера: лаг event loop и ожидание соединения из пула БД"""
+
+    def __init__(self):
+        self.loop_lag = 0.0
+        self.pool_wait = 0.0
+
+    def record_pool_wait(self, seconds: float) -> None:
+        self.pool_wait += SMOOTHING * (seconds - self.pool_wait)
+
+    def overloaded(self, settings: Settings) -> bool:
+        return (
+            self.loop_lag * 1000 > settings.admission_max_loop_lag_ms
+            or self.pool_wait * 1000 > settings.admission_max_pool_wait_ms
+        )
+
+    async def monitor_loop_lag(self, interval: float) -> None:
+        """Лаг — насколько позже запланированного просыпается sleep: всё это время loop был занят"""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(time.perf_counter() - start - interval, 0.0)
+            self.loop_lag += SMOOTHING * (lag - self.loop_lag)
+            EVENT_LOOP_LAG.set(self.loop_lag)
+
+
+load_signals = LoadSignals()
+
+
+class Limiter:
+    """
+    Ограничение числа одновременных запросов с очередью по приоритетам.
+
+    Освободившийся слот получает самый приоритетный (затем самый ранний) ожидающий.
+    Таймаут ожидания адаптивный, как в CoDel: пока очередь рассасывается, запрос ждёт до interval;
+    если время ожидания держится выше target дольше interval, очередь считается стоячей —
+    ожидание сокращается до target, а запросы низкого приоритета отбрасываются сразу.
+    Свободный слот при пустой очереди выдаётся всегда: отбрасывать есть смысл только при нехватке слотов.
+    """
+
+    def __init__(self, capacity: int, max_queue: int, target: float, interval: float):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.target = target
+        self.interval = interval
+        self.in_flight = 0
+        self.queued = 0
+        self.overloaded = False
+        self._first_above: Optional[float] = None
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    def _record_wait(self, waited: float) -> None:
+        if waited < self.target:
+            self._first_above = None
+            self.overloaded = False
+            return
+        now = time.monotonic()
+        if self._first_above is None:
+            self._first_above = now + self.interval
+        elif now >= self._first_above:
+            self.overloaded = True
+
+    async def acquire(self, priority: int, shed_low: bool) -> bool:
+        """Занять слот; False — запрос нужно отбросить. shed_low срабатывает, только если свободных слотов нет"""
+        if self.in_flight < self.capacity and not self.queued:
+            self.in_flight += 1
+            self._record_wait(0.0)
+            return True
+        if self.queued >= self.max_queue or (priority == LOW and (self.overloaded or shed_low)):
+            return False
+
+        timeout = self.target if self.overloaded or shed_low else self.interval
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            async with asyncio.timeout(timeout):
+                await future
+        except TimeoutError:
+            # Слот мог быть передан в тот же момент, когда сработал таймаут
+            if not future.done() or future.cancelled():
+                future.cancel()
+                self.queued -= 1
+                self._record_wait(timeout)
+                return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+                self.queued -= 1
+            raise
+        self._record_wait(time.monotonic() - start)
+        return True
+
+    def release(self) -> None:
+        # Слот передаётся ожидающему напрямую, in_flight при этом не меняется
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.queued -= 1
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class AdmissionMiddleware:
+    """
+    Admission control на уровне ASGI: при перегрузке дорогие запросы (/auth, /signup) отбрасываются
+    с 503 и Retry-After раньше, чем дешёвые с проверкой токена.
+
+    Запрос проходит лимит своего маршрута (если задан в admission_route_limits), затем общий лимит воркера.
+    Низкий приоритет отбрасывается сразу, если слотов нет и при этом очередь стоячая или лаг event loop /
+    ожидание пула БД выше порогов. Маршруты из admission_exempt_routes (health, ready, metrics) не ограничиваются.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._limiters: Optional[dict[str, Limiter]] = None
+        self._global: Optional[Limiter] = None
+        self._low_priority: frozenset[str] = frozenset()
+        self._exempt: frozenset[str] = frozenset()
+        self._routes: OrderedDict[tuple[str, str], Optional[str]] = OrderedDict()
+
+    def _configure(self, settings: Settings) -> None:
+        self._low_priority = frozenset(settings.admission_low_priority_route_list)
+        self._exempt = frozenset(settings.admission_exempt_route_list)
+        target = settings.admission_target_ms / 1000
+        interval = settings.admission_interval_ms / 1000
+        self._limiters = {
+            route: Limiter(limit, settings.admission_max_queue, target, interval)
+            for route, limit in settings.admission_route_limit_map.items()
+        }
+        self._global = Limiter(settings.admission_max_concurrency, settings.admission_max_queue, target, interval)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        settings = get_settings()
+        if scope["type"] != "http" or not settings.admission_enabled:
+            return await self.app(scope, receive, send)
+
+        if self._limiters is None:
+            self._configure(settings)
+        route = self._route_path(scope)
+        if route in self._exempt:
+            return await self.app(scope, receive, send)
+
+        priority = LOW if route in self._low_priority else HIGH
+        shed_low = load_signals.overloaded(settings)
+        acquired = []
+        try:
+            for limiter in (self._limiters.get(route), self._global):
+                if limiter is None:
+                    continue
+                if not await limiter.acquire(priority, shed_low):
+                    count_shed(route or "unmatched", "low" if priority == LOW else "high")
+                    return await _send_overloaded(send, settings.admission_retry_after_seconds)
+                acquired.append(limiter)
+            await self.app(scope, receive, send)
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    def _route_path(self, scope: Scope) -> Optional[str]:
+        """Шаблон маршрута до роутинга: по нему назначаются лимит и приоритет. Перебор маршрутов кэшируется по пути"""
+        key = (scope["method"], scope["path"])
+        if key in self._routes:
+            self._routes.move_to_end(key)
+            return self._routes[key]
+        path = None
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                path = route.path
+                break
+        self._routes[key] = path
+        if len(self._routes) > ROUTE_CACHE_SIZE:
+            self._routes.popitem(last=False)
+        return path
+
+
+async def _send_overloaded(send: Send, retry_after: int) -> None:
+    body = orjson.dumps({"detail": "Сервис перегружен, повторите запрос позже"})
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(retry_after).encode()),
+    ]
+    await send({"type": "http.response.start", "status": 503, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,40 @@
+import time
+from typing import Optional
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для внешней зависимости (Redis).
+
+    После failure_threshold ошибок подряд размыкается и reset_timeout секунд не пропускает запросы,
+    затем пропускает один пробный: успех замыкает цепь, ошибка снова размыкает.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.reset_timeout:
+            # Полуоткрытое состояние: пропускаем один пробный запрос, остальные ждут следующего окна
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
@@ -0,0 +1,187 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import time
+
+import orjson
+from redis.exceptions import RedisError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.config import get_settings
+from src.db import redis_db
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_PREFIX = "idempotency:"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+
+
+class IdempotencyMiddleware:
+    """
+    Поддержка заголовка Idempotency-Key для POST-маршрутов из настроек (/signup, /auth).
+
+    Ключ в Redis привязан к вызывающему (хэш заголовка Authorization, без него — IP клиента), так что
+    чужой Idempotency-Key не даёт доступа к сохранённому ответу. Первый запрос с ключом захватывает
+    блокировку (SET NX), выполняется, и его ответ сохраняется на idempotency_ttl_seconds. Повторы с тем же
+    ключом и тем же телом получают сохранённый ответ, конкурентные дубли ждут завершения первого запроса.
+    Тот же ключ с другим телом — 422.
+
+    Ответы 5xx не сохраняются, чтобы запрос можно было повторить; ответы маршрутов, выдающих токены
+    (idempotency_no_store_routes), тоже — токены не должны лежать в Redis открытым текстом. Для них
+    ключ только не даёт дублям выполняться одновременно: ожидающий дубль после первого запроса
+    выполняется сам. Ошибки Redis после захвата блокировки не ломают уже отправленный ответ.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+
+        settings = get_settings()
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        if not idempotency_key or scope["path"] not in settings.idempotency_route_list:
+            return await self.app(scope, receive, send)
+        if len(idempotency_key) > 255:
+            return await _send_json(send, 400, {"detail": "Idempotency-Key слишком длинный"})
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = f"{IDEMPOTENCY_PREFIX}{scope['path']}:{_caller(scope, headers)}:{idempotency_key}"
+        store_response = scope["path"] not in settings.idempotency_no_store_route_list
+        redis = redis_db.redis
+
+        deadline = time.monotonic() + settings.idempotency_lock_seconds
+        while True:
+            try:
+                acquired = await redis.set(
+                    key,
+                    orjson.dumps({"state": IN_FLIGHT, "fingerprint": fingerprint}).decode(),
+                    nx=True,
+                    ex=settings.idempotency_lock_seconds,
+                )
+                if acquired:
+                    break
+                stored = await self._wait_for_result(redis, key, deadline)
+            except (RedisError, OSError):
+                logger.warning("Redis недоступен, запрос выполняется без идемпотентности", exc_info=True)
+                return await self.app(scope, _replay_body(body), send)
+
+            if stored is not None:
+                if stored["fingerprint"] != fingerprint:
+                    return await _send_json(send, 422, {"detail": "Idempotency-Key уже использован с другим запросом"})
+                return await _send_stored(send, stored)
+            if time.monotonic() >= deadline:
+                return await _send_json(send, 409, {"detail": "Запрос с этим Idempotency-Key ещё выполняется"})
+            # Первый запрос завершился без сохранённого ответа (5xx или маршрут с токенами) — пробуем сами
+
+        captured: dict = {"headers": [], "body": b""}
+
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body" and store_response:
+                captured["body"] += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, _replay_body(body), capture)
+        except Exception:
+            await _release(redis, key)
+            raise
+
+        if not store_response or captured.get("status", 500) >= 500:
+            await _release(redis, key)
+            return
+        stored = {
+            "state": DONE,
+            "fingerprint": fingerprint,
+            "status": captured["status"],
+            "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in captured["headers"]],
+            "body": base64.b64encode(captured["body"]).decode(),
+        }
+        try:
+            await redis.set(key, orjson.dumps(stored).decode(), ex=settings.idempotency_ttl_seconds)
+        except (RedisError, OSError):
+            # Ответ уже отправлен; блокировка истечёт сама, повтор после этого выполнится заново
+            logger.warning("Не удалось сохранить ответ для Idempotency-Key", exc_info=True)
+
+    @staticmethod
+    async def _wait_for_result(redis, key: str, deadline: float) -> dict | None:
+        """Дождаться ответа первого запроса; None — ключ освобождён без ответа или не дождались"""
+        delay = 0.02
+        while time.monotonic() < deadline:
+            raw = await redis.get(key)
+            if raw is None:
+                return None
+            stored = orjson.loads(raw)
+            if stored["state"] == DONE:
+                return stored
+            await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, 0.5)
+        return None
+
+
+def _caller(scope: Scope, headers: Headers) -> str:
+    """Короткий хэш того, кто делает запрос: токен из Authorization, без него — IP клиента"""
+    principal = headers.get("authorization")
+    if not principal:
+        forwarded_for = headers.get("x-forwarded-for")
+        client = scope.get("client")
+        principal = (
+            forwarded_for.split(",")[0].strip()
+            if forwarded_for
+            else headers.get("x-real-ip") or (client[0] if client else "unknown")
+        )
+    return hashlib.sha256(principal.encode()).hexdigest()[:32]
+
+
+async def _release(redis, key: str) -> None:
+    try:
+        await redis.delete(key)
+    except (RedisError, OSError):
+        logger.warning("Не удалось снять блокировку Idempotency-Key, она истечёт сама", exc_info=True)
+
+
+async def _read_body(receive: Receive) -> bytes:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+def _replay_body(body: bytes) -> Receive:
+    sent = False
+
+    async def receive() -> Message:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Тело уже отдано: дальше приложение может ждать только отключения клиента
+        await asyncio.Event().wait()
+
+    return receive
+
+
+async def _send_stored(send: Send, stored: dict) -> None:
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in stored["headers"]]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": stored["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": base64.b64decode(stored["body"])})
+
+
+async def _send_json(send: Send, status_code: int, content: dict) -> None:
+    body = orjson.dumps(content)
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,150 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Под gunicorn каждый воркер пишет значения в mmap-файлы каталога PROMETHEUS_MULTIPROC_DIR,
+# /metrics любого воркера собирает их вместе. Переменная должна быть задана до импорта prometheus_client.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ["method", "route", "status"]
+)
+LOGINS = Counter("auth_logins_total", "Попытки входа по статусу", ["status"])
+PASSWORD_HASH_SECONDS = Histogram(
+    "auth_password_hash_seconds",
+    "Время хэширования и проверки пароля",
+    ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+DB_POOL_IN_USE = Gauge("db_pool_connections_in_use", "Соединения пула, выданные сессиям", multiprocess_mode="livesum")
+REDIS_COMMAND_SECONDS = Histogram(
+    "redis_command_duration_seconds",
+    "Время выполнения команды Redis",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+REVOCATION_CHECKS = Counter("auth_revocation_checks_total", "Результаты проверки отзыва токена", ["outcome"])
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Ожидание соединения из пула БД",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+EVENT_LOOP_LAG = Gauge("event_loop_lag_seconds", "Сглаженный лаг event loop воркера", multiprocess_mode="max")
+CLIENT_TOKENS = Counter("auth_client_tokens_total", "Запросы токенов по client credentials", ["outcome"])
+USER_AGENT_CACHE = Counter("auth_user_agent_cache_total", "Разбор User-Agent: кэш и быстрый путь", ["outcome"])
+PROFILE_CACHE = Counter("auth_profile_cache_requests_total", "Обращения к кэшу профилей", ["outcome"])
+REQUESTS_SHED = Counter("http_requests_shed_total", "Запросы, отброшенные admission control", ["route", "priority"])
+
+# labels() на каждом вызове ищет дочернюю метрику под блокировкой — фиксированные метки связываются один раз
+PASSWORD_HASH = PASSWORD_HASH_SECONDS.labels("hash")
+PASSWORD_VERIFY = PASSWORD_HASH_SECONDS.labels("verify")
+REVOCATION_REVOKED = REVOCATION_CHECKS.labels("revoked")
+REVOCATION_VALID = REVOCATION_CHECKS.labels("valid")
+REVOCATION_SNAPSHOT_REVOKED = REVOCATION_CHECKS.labels("snapshot_revoked")
+REVOCATION_SNAPSHOT_VALID = REVOCATION_CHECKS.labels("snapshot_valid")
+REVOCATION_FAIL_OPEN = REVOCATION_CHECKS.labels("fail_open")
+REVOCATION_FAIL_CLOSED = REVOCATION_CHECKS.labels("fail_closed")
+CLIENT_TOKEN_CACHED = CLIENT_TOKENS.labels("cached")
+CLIENT_TOKEN_ISSUED = CLIENT_TOKENS.labels("issued")
+CLIENT_TOKEN_REJECTED = CLIENT_TOKENS.labels("rejected")
+USER_AGENT_CACHE_HIT = USER_AGENT_CACHE.labels("hit")
+USER_AGENT_CACHE_MISS = USER_AGENT_CACHE.labels("miss")
+USER_AGENT_FAST_PATH = USER_AGENT_CACHE.labels("fast_path")
+PROFILE_CACHE_HIT = PROFILE_CACHE.labels("hit")
+PROFILE_CACHE_MISS = PROFILE_CACHE.labels("miss")
+PROFILE_CACHE_COALESCED = PROFILE_CACHE.labels("coalesced")
+PROFILE_CACHE_ERROR = PROFILE_CACHE.labels("error")
+
+# Метки, известные только во время работы (маршрут, статус, команда), кэшируются в обычных словарях:
+# чтение dict в однопоточном event loop не требует блокировок
+_request_children: dict[tuple[str, str, int], Histogram] = {}
+_login_children: dict[str, Counter] = {}
+_redis_children: dict[str, Histogram] = {}
+_shed_children: dict[tuple[str, str], Counter] = {}
+
+
+def observe_request(method: str, route: str, status_code: int, seconds: float) -> None:
+    key = (method, route, status_code)
+    child = _request_children.get(key)
+    if child is None:
+        child = _request_children[key] = REQUEST_LATENCY.labels(method, route, str(status_code))
+    child.observe(seconds)
+
+
+def count_login(login_status: str) -> None:
+    child = _login_children.get(login_status)
+    if child is None:
+        child = _login_children[login_status] = LOGINS.labels(login_status)
+    child.inc()
+
+
+def observe_redis_command(command: str, seconds: float) -> None:
+    child = _redis_children.get(command)
+    if child is None:
+        child = _redis_children[command] = REDIS_COMMAND_SECONDS.labels(command)
+    child.observe(seconds)
+
+
+def count_shed(route: str, priority: str) -> None:
+    key = (route, priority)
+    child = _shed_children.get(key)
+    if child is None:
+        child = _shed_children[key] = REQUESTS_SHED.labels(route, priority)
+    child.inc()
+
+
+def instrument_pool(engine: AsyncEngine) -> None:
+    """Считать соединения пула, занятые сессиями"""
+    event.listen(engine.sync_engine, "checkout", lambda *args: DB_POOL_IN_USE.inc())
+    event.listen(engine.sync_engine, "checkin", lambda *args: DB_POOL_IN_USE.dec())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Гистограмма длительности запросов по шаблону маршрута (чистый ASGI, без BaseHTTPMiddleware)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Шаблон пути, а не сам путь: иначе user_id в URL раздувает число временных рядов
+            route = scope.get("route")
+            observe_request(
+                scope["method"], route.path if route else "unmatched", status_code, time.perf_counter() - start
+            )
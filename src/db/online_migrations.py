@@ -0,0 +1,278 @@
+"""
+Помощники для online-миграций: схема меняется под живой нагрузкой, без долгих ACCESS EXCLUSIVE.
+
+Каждый шаг выполняется вне транзакции миграции (autocommit_block) и держит тяжёлую блокировку
+не дольше одного короткого запроса:
+
+- индексы строятся CONCURRENTLY;
+- CHECK и FOREIGN KEY добавляются NOT VALID и проверяются отдельно (VALIDATE не блокирует запись);
+- NOT NULL ставится по уже проверенному CHECK, без сканирования таблицы под блокировкой;
+- данные дозаполняются пачками по ключу с паузами и контрольной точкой, прерванная миграция продолжается;
+- DDL ждёт блокировку не дольше lock_timeout и повторяется: ожидающий ALTER TABLE ставит в очередь
+  за собой все запросы к таблице, поэтому лучше отступить и попробовать снова.
+
+Импорт в ревизиях: from src.db.online_migrations import ... (корень проекта в sys.path через
+prepend_sys_path в alembic.ini, поэтому импорт работает и в alembic heads/history/revision без env.py).
+Рецепты — в alembic/README.
+"""
+
+import logging
+import time
+from typing import Optional, Sequence
+
+from sqlalchemy.exc import DBAPIError
+
+from alembic import context, op
+
+logger = logging.getLogger("alembic.online")
+
+LOCK_TIMEOUT = "2s"
+LOCK_ATTEMPTS = 20
+LOCK_BACKOFF_SECONDS = 1.0
+LOCK_BACKOFF_MAX_SECONDS = 30.0
+# lock_not_available и deadlock_detected: транзакцию можно просто повторить
+RETRYABLE_SQLSTATES = {"55P03", "40P01"}
+
+CHECKPOINT_TABLE = "alembic_online_checkpoints"
+
+
+def _retryable(error: DBAPIError) -> bool:
+    return getattr(error.orig, "pgcode", None) in RETRYABLE_SQLSTATES
+
+
+def _backoff(attempt: int) -> float:
+    return min(LOCK_BACKOFF_SECONDS * 2 ** (attempt - 1), LOCK_BACKOFF_MAX_SECONDS)
+
+
+def execute_with_lock_retry(statement: str, lock_timeout: str = LOCK_TIMEOUT, attempts: int = LOCK_ATTEMPTS) -> None:
+    """
+    Выполнить DDL с коротким ожиданием блокировки (ADD COLUMN, ADD CONSTRAINT ... NOT VALID, SET NOT NULL).
+
+    Каждая попытка — отдельная транзакция из одного запроса; при lock_timeout или дедлоке — пауза и повтор.
+    """
+    with op.get_context().autocommit_block():
+        if context.is_offline_mode():
+            op.execute(f"SET lock_timeout = '{lock_timeout}'")
+            op.execute(statement)
+            op.execute("RESET lock_timeout")
+            return
+
+        bind = op.get_bind()
+        for attempt in range(1, attempts + 1):
+            bind.exec_driver_sql(f"SET lock_timeout = '{lock_timeout}'")
+            try:
+                bind.exec_driver_sql(statement)
+                return
+            except DBAPIError as error:
+                if not _retryable(error) or attempt == attempts:
+                    raise
+                delay = _backoff(attempt)
+                logger.warning(
+                    "Блокировка не получена (попытка %s), повтор через %.1f с: %s", attempt, delay, statement
+                )
+                time.sleep(delay)
+            finally:
+                bind.exec_driver_sql("RESET lock_timeout")
+
+
+def create_index_concurrently(name: str, table: str, columns: Sequence, **kw) -> None:
+    """CREATE INDEX CONCURRENTLY; INVALID-индекс от прерванной попытки удаляется перед повтором"""
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        op.create_index(name, table, columns, postgresql_concurrently=True, **kw)
+
+
+def drop_index_concurrently(name: str, table: str) -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def _constraint_exists(table: str, name: str) -> bool:
+    if context.is_offline_mode():
+        return False
+    query = "SELECT 1 FROM pg_constraint WHERE conrelid = CAST(%(table)s AS regclass) AND conname = %(name)s"
+    return op.get_bind().exec_driver_sql(query, {"table": table, "name": name}).first() is not None
+
+
+def add_constraint_not_valid(table: str, name: str, definition: str) -> None:
+    """
+    CHECK или FOREIGN KEY без проверки существующих строк: блокировка на время записи в каталог.
+
+    Новые и изменённые строки проверяются сразу, существующие — в validate_constraint.
+    Повторный запуск прерванной миграции уже добавленное ограничение пропускает.
+    """
+    if _constraint_exists(table, name):
+        logger.info("Ограничение %s.%s уже есть", table, name)
+        return
+    execute_with_lock_retry(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID")
+
+
+def validate_constraint(table: str, name: str) -> None:
+    """Проверить существующие строки: SHARE UPDATE EXCLUSIVE, чтение и запись в таблицу продолжаются"""
+    execute_with_lock_retry(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def set_not_null(table: str, column: str) -> None:
+    """
+    SET NOT NULL без полного сканирования под ACCESS EXCLUSIVE (PostgreSQL 12+).
+
+    Сначала CHECK (column IS NOT NULL) NOT VALID и его проверка без блокировки записи, тогда SET NOT NULL
+    опирается на проверенный CHECK и не читает таблицу; вспомогательный CHECK затем удаляется.
+    """
+    check = f"{table}_{column}_not_null"
+    add_constraint_not_valid(table, check, f"CHECK ({column} IS NOT NULL)")
+    validate_constraint(table, check)
+    execute_with_lock_retry(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+    execute_with_lock_retry(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}")
+
+
+def add_unique_constraint_using_index(table: str, name: str, index: str) -> None:
+    """UNIQUE-ограничение поверх индекса, уже построенного create_index_concurrently(..., unique=True)"""
+    if _constraint_exists(table, name):
+        logger.info("Ограничение %s.%s уже есть", table, name)
+        return
+    execute_with_lock_retry(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {index}")
+
+
+def _ensure_checkpoint_table(bind) -> None:
+    bind.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} ("
+        "name VARCHAR(255) PRIMARY KEY, "
+        "last_key TEXT, "
+        "rows_done BIGINT NOT NULL DEFAULT 0, "
+        "updated_at TIMESTAMP NOT NULL DEFAULT now(), "
+        "finished_at TIMESTAMP)"
+    )
+
+
+def _key_type(bind, table: str, key: str) -> str:
+    query = (
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = CAST(%(table)s AS regclass) AND attname = %(key)s"
+    )
+    return bind.exec_driver_sql(query, {"table": table, "key": key}).scalar_one()
+
+
+def _replica_lag(bind) -> float:
+    # Нужна роль с pg_monitor, иначе replay_lag пуст и ожидание не включается
+    query = "SELECT COALESCE(MAX(EXTRACT(EPOCH FROM replay_lag)), 0) FROM pg_stat_replication"
+    return float(bind.exec_driver_sql(query).scalar_one())
+
+
+def backfill(
+    name: str,
+    table: str,
+    assignments: str,
+    where: str = "TRUE",
+    key: str = "id",
+    batch_size: int = 1000,
+    pause_seconds: float = 0.1,
+    max_batch_seconds: float = 1.0,
+    max_replica_lag_seconds: Optional[float] = None,
+    lock_timeout: str = LOCK_TIMEOUT,
+) -> int:
+    """
+    UPDATE table SET assignments WHERE where — пачками по ключу (keyset), каждая пачка в своей транзакции.
+
+    Пачка и контрольная точка (последний ключ в alembic_online_checkpoints под именем name) пишутся
+    одним запросом: после обрыва миграция продолжает с места остановки, а законченный backfill
+    при повторном запуске пропускается. Между пачками — пауза pause_seconds; пачка дольше max_batch_seconds
+    уменьшает размер следующих вдвое; при max_replica_lag_seconds пачки ждут, пока реплики догонят.
+    Возвращает число обновлённых строк в этом запуске.
+    """
+    if context.is_offline_mode():
+        raise RuntimeError(f"backfill {name} выполняется только online: alembic upgrade без --sql")
+
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        _ensure_checkpoint_table(bind)
+        checkpoint = bind.exec_driver_sql(
+            f"SELECT last_key, finished_at FROM {CHECKPOINT_TABLE} WHERE name = %(name)s", {"name": name}
+        ).first()
+        if checkpoint is not None and checkpoint.finished_at is not None:
+            logger.info("Backfill %s уже выполнен", name)
+            return 0
+        last_key = checkpoint.last_key if checkpoint is not None else None
+
+        key_type = _key_type(bind, table, key)
+        statement = f"""
+            WITH batch AS (
+                SELECT {key} AS backfill_key FROM {table}
+                WHERE (CAST(%(last)s AS {key_type}) IS NULL OR {key} > CAST(%(last)s AS {key_type})) AND ({where})
+                ORDER BY {key}
+                LIMIT %(size)s
+            ),
+            updated AS (
+                UPDATE {table} AS target SET {assignments}
+                FROM batch WHERE target.{key} = batch.backfill_key
+                RETURNING 1
+            ),
+            last_row AS (SELECT backfill_key FROM batch ORDER BY backfill_key DESC LIMIT 1),
+            saved AS (
+                INSERT INTO {CHECKPOINT_TABLE} (name, last_key, rows_done, updated_at)
+                SELECT %(name)s, CAST(backfill_key AS TEXT), (SELECT count(*) FROM updated), now() FROM last_row
+                ON CONFLICT (name) DO UPDATE SET
+                    last_key = EXCLUDED.last_key,
+                    rows_done = {CHECKPOINT_TABLE}.rows_done + EXCLUDED.rows_done,
+                    updated_at = now()
+            )
+            SELECT (SELECT CAST(backfill_key AS TEXT) FROM last_row), (SELECT count(*) FROM updated)
+        """
+
+        size = batch_size
+        total = 0
+        attempt = 0
+        bind.exec_driver_sql(f"SET lock_timeout = '{lock_timeout}'")
+        try:
+            while True:
+                if max_replica_lag_seconds is not None:
+                    while (lag := _replica_lag(bind)) > max_replica_lag_seconds:
+                        logger.info("Backfill %s ждёт реплики: отставание %.1f с", name, lag)
+                        time.sleep(max(pause_seconds, 1.0))
+
+                started = time.monotonic()
+                try:
+                    row = bind.exec_driver_sql(statement, {"last": last_key, "size": size, "name": name}).one()
+                except DBAPIError as error:
+                    attempt += 1
+                    if not _retryable(error) or attempt == LOCK_ATTEMPTS:
+                        raise
+                    time.sleep(_backoff(attempt))
+                    continue
+                attempt = 0
+                elapsed = time.monotonic() - started
+
+                batch_last_key, updated = row
+                if batch_last_key is None:
+                    break
+                last_key = batch_last_key
+                total += updated
+                logger.info(
+                    "Backfill %s: +%s строк (всего %s), ключ %s, %.2f с", name, updated, total, last_key, elapsed
+                )
+
+                if elapsed > max_batch_seconds:
+                    size = max(size // 2, 1)
+                elif size < batch_size and elapsed < max_batch_seconds / 4:
+                    size = min(size * 2, batch_size)
+                time.sleep(pause_seconds)
+        finally:
+            bind.exec_driver_sql("RESET lock_timeout")
+
+        bind.exec_driver_sql(
+            f"INSERT INTO {CHECKPOINT_TABLE} (name, finished_at) VALUES (%(name)s, now()) "
+            "ON CONFLICT (name) DO UPDATE SET finished_at = now(), updated_at = now()",
+            {"name": name},
+        )
+        logger.info("Backfill %s завершён: %s строк", name, total)
+        return total
+
+
+def reset_backfill(name: str) -> None:
+    """Забыть контрольную точку (в downgrade): следующий upgrade выполнит backfill заново"""
+    if context.is_offline_mode():
+        op.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE name = '{name}'")
+        return
+    bind = op.get_bind()
+    _ensure_checkpoint_table(bind)
+    bind.exec_driver_sql(f"DELETE FROM {CHECKPOINT_TABLE} WHERE name = %(name)s", {"name": name})
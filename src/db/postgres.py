@@ -1,21 +1,67 @@
+import time
 from contextlib import contextmanager
+from typing import Optional
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import AsyncAdaptedQueuePool, create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
-from src.core.config import settings
+from src.core.admission import load_signals
+from src.core.config import Settings
+from src.core.metrics import DB_POOL_WAIT_SECONDS, instrument_pool
 
+engine: Optional[AsyncEngine] = None
+async_session: Optional[async_sessionmaker[AsyncSession]] = None
 
-dsn = f"postgresql+asyncpg://{settings.postgres_user}:{settings.postgres_password}@{settings.database_host}:{settings.database_port}/{settings.postgres_db}"
+# Синхронный движок нужен только CLI, web-воркеры его не создают
+sync_session: Optional[sessionmaker[Session]] = None
 
-engine = create_async_engine(dsn, future=True)
-async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет ожидание соединения: это сигнал перегрузки для admission control"""
 
-sync_dsn = f"postgresql://{settings.postgres_user}:{settings.postgres_password}@{settings.database_host}:{settings.database_port}/{settings.postgres_db}"
-sync_engine = create_engine(sync_dsn, echo=False, pool_pre_ping=True)
-sync_session = sessionmaker(bind=sync_engine, autocommit=False, autoflush=False)
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            DB_POOL_WAIT_SECONDS.observe(waited)
+            load_signals.record_pool_wait(waited)
+
+
+def build_dsn(settings: Settings, driver: str = "postgresql+asyncpg") -> str:
+    return f"{driver}://{settings.postgres_user}:{settings.postgres_password}@{settings.database_host}:{settings.database_port}/{settings.postgres_db}"
+
+
+def init_engine(settings: Settings) -> None:
+    """Создать async-движок и фабрику сессий (вызывается из lifespan)"""
+    global engine, async_session
+    engine = create_async_engine(
+        build_dsn(settings),
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_size=settings.database_pool_size,
+        max_overflow=settings.database_max_overflow,
+    )
+    instrument_pool(engine)
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def close_engine() -> None:
+    """Закрыть все соединения пула (вызывается при остановке приложения)"""
+    global engine, async_session
+    if engine is not None:
+        await engine.dispose()
+    engine = None
+    async_session = None
+
+
+def init_sync_engine(settings: Settings) -> None:
+    """Создать синхронный движок psycopg2 (вызывается только из cli.py)"""
+    global sync_session
+    sync_engine = create_engine(build_dsn(settings, driver="postgresql"), echo=False, pool_pre_ping=True)
+    sync_session = sessionmaker(bind=sync_engine, autocommit=False, autoflush=False)
 
 
 async def get_session() -> AsyncSession:
@@ -0,0 +1,168 @@
+"""
+Горячие запросы без ORM-гидратации.
+
+Выражения строятся через lambda_stmt: конструкция select() и её ключ кэша вычисляются один раз
+на lambda, при следующих вызовах подставляются только значения параметров. Запросы выполняются
+на соединении сессии как Core, строки превращаются в лёгкие записи со __slots__ — без identity map,
+отслеживания изменений и событий загрузки. Записи только для чтения: изменения — через update().
+"""
+
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, lambda_stmt, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+
+from src.models.user import UNUSABLE_PASSWORD, LoginHistory, Role, User, verify_password
+
+
+class UserRecord:
+    """Строка users"""
+
+    __slots__ = ("id", "login", "email", "password", "first_name", "last_name", "role_id", "created_at")
+
+    def __init__(
+        self,
+        id: uuid.UUID,
+        login: str,
+        email: str,
+        password: str,
+        first_name: Optional[str],
+        last_name: Optional[str],
+        role_id: uuid.UUID,
+        created_at: Optional[datetime],
+    ):
+        self.id = id
+        self.login = login
+        self.email = email
+        self.password = password
+        self.first_name = first_name
+        self.last_name = last_name
+        self.role_id = role_id
+        self.created_at = created_at
+
+    def check_password(self, password: str) -> bool:
+        if self.password == UNUSABLE_PASSWORD:
+            return False
+        return verify_password(password, self.password)
+
+
+class RoleRecord:
+    """Строка roles"""
+
+    __slots__ = ("id", "name")
+
+    def __init__(self, id: uuid.UUID, name: str):
+        self.id = id
+        self.name = name
+
+
+# Порядок колонок совпадает с аргументами конструкторов записей
+USER_COLUMNS = (
+    User.id,
+    User.login,
+    User.email,
+    User.password,
+    User.first_name,
+    User.last_name,
+    User.role_id,
+    User.created_at,
+)
+LOGIN_HISTORY_COLUMNS = (
+    LoginHistory.id,
+    LoginHistory.user_id,
+    LoginHistory.ip_address,
+    LoginHistory.user_agent,
+    LoginHistory.device_type,
+)
+
+
+def user_by_identifier_stmt(identifier: str) -> StatementLambdaElement:
+    """
+    Пользователь по email или логину без учёта регистра.
+
+    Оба условия покрыты функциональными индексами ix_users_email_lower и ix_users_login_lower,
+    Postgres объединяет их через BitmapOr — один запрос без seq scan.
+    """
+    identifier = identifier.strip()
+    return lambda_stmt(
+        lambda: select(*USER_COLUMNS).where(
+            or_(func.lower(User.email) == func.lower(identifier), func.lower(User.login) == func.lower(identifier))
+        )
+    )
+
+
+def user_by_id_stmt(user_id) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(*USER_COLUMNS).where(User.id == user_id))
+
+
+def role_by_name_stmt(name: str) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Role.id, Role.name).where(Role.name == name))
+
+
+def user_conflict_stmt(login: str, email: str) -> StatementLambdaElement:
+    """Уже занятые логин или email (без учёта регистра)"""
+    return lambda_stmt(
+        lambda: select(User.id)
+        .where(or_(func.lower(User.login) == func.lower(login), func.lower(User.email) == func.lower(email)))
+        .limit(1)
+    )
+
+
+def login_conflict_stmt(login: str, user_id) -> StatementLambdaElement:
+    """Логин занят другим пользователем (без учёта регистра)"""
+    return lambda_stmt(
+        lambda: select(User.id).where(func.lower(User.login) == func.lower(login), User.id != user_id).limit(1)
+    )
+
+
+def user_profile_stmt(user_id) -> StatementLambdaElement:
+    """Проекция пользователя с именем роли, без хэша пароля"""
+    return lambda_stmt(
+        lambda: select(
+            User.id,
+            User.login,
+            User.email,
+            User.first_name,
+            User.last_name,
+            User.role_id,
+            Role.name.label("role"),
+            User.created_at,
+        )
+        .join(Role, User.role_id == Role.id)
+        .where(User.id == user_id)
+    )
+
+
+def login_history_stmt(user_id) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(*LOGIN_HISTORY_COLUMNS).where(LoginHistory.user_id == user_id))
+
+
+async def fetch_user_by_identifier(db: AsyncSession, identifier: str) -> Optional[UserRecord]:
+    connection = await db.connection()
+    row = (await connection.execute(user_by_identifier_stmt(identifier))).first()
+    return UserRecord(*row) if row is not None else None
+
+
+async def fetch_user_by_id(db: AsyncSession, user_id) -> Optional[UserRecord]:
+    connection = await db.connection()
+    row = (await connection.execute(user_by_id_stmt(user_id))).first()
+    return UserRecord(*row) if row is not None else None
+
+
+async def fetch_role_by_name(db: AsyncSession, name: str) -> Optional[RoleRecord]:
+    connection = await db.connection()
+    row = (await connection.execute(role_by_name_stmt(name))).first()
+    return RoleRecord(*row) if row is not None else None
+
+
+async def user_exists(db: AsyncSession, login: str, email: str) -> bool:
+    connection = await db.connection()
+    return (await connection.execute(user_conflict_stmt(login, email))).first() is not None
+
+
+async def login_taken(db: AsyncSession, login: str, user_id) -> bool:
+    connection = await db.connection()
+    return (await connection.execute(login_conflict_stmt(login, user_id))).first() is not None
@@ -1,9 +1,23 @@
+import time
 from typing import Optional
 
 from redis.asyncio import Redis
 
+from src.core.metrics import observe_redis_command
+
 redis: Optional[Redis] = None
 
 
+class InstrumentedRedis(Redis):
+    """Клиент Redis, который пишет длительность каждой команды в метрики (пайплайны не учитываются)"""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_redis_command(str(args[0]), time.perf_counter() - start)
+
+
 async def get_redis() -> Redis:
     return redis
@@ -0,0 +1,156 @@
+import itertools
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, Result
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql import Executable
+from sqlalchemy.sql.util import find_tables
+
+from src.core.config import Settings
+
+# Ключ в session.info: таблицы, в которые сессия (то есть текущий запрос) уже писала
+WRITTEN_TABLES = "written_tables"
+
+# Таблица после INSERT INTO / UPDATE / DELETE FROM; лишние совпадения (FOR UPDATE OF, DO UPDATE SET)
+# только оставляют чтение на primary
+_WRITTEN_TABLE = re.compile(r'\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+class ReplicaPool:
+    """Реплики для чтения: перебор по кругу, упавшая реплика выключается на retry_after секунд"""
+
+    def __init__(self, session_factories: list[async_sessionmaker[AsyncSession]], retry_after: float):
+        self.session_factories = session_factories
+        self.retry_after = retry_after
+        self._down_until = [0.0] * len(session_factories)
+        self._counter = itertools.count()
+
+    def candidates(self) -> Iterator[tuple[int, async_sessionmaker[AsyncSession]]]:
+        now = time.monotonic()
+        start = next(self._counter)
+        for offset in range(len(self.session_factories)):
+            index = (start + offset) % len(self.session_factories)
+            if self._down_until[index] <= now:
+                yield index, self.session_factories[index]
+
+    def mark_down(self, index: int) -> None:
+        self._down_until[index] = time.monotonic() + self.retry_after
+
+
+replica_pool: Optional[ReplicaPool] = None
+replica_engines: list[AsyncEngine] = []
+
+
+def init_replicas(settings: Settings) -> None:
+    """Создать движки реплик из настроек (вызывается из lifespan)"""
+    global replica_pool, replica_engines
+    replica_engines = [
+        create_async_engine(dsn, connect_args={"timeout": settings.database_replica_connect_timeout})
+        for dsn in settings.replica_dsns
+    ]
+    if not replica_engines:
+        replica_pool = None
+        return
+    session_factories = [
+        async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+        for replica_engine in replica_engines
+    ]
+    replica_pool = ReplicaPool(session_factories, retry_after=settings.database_replica_retry_seconds)
+
+
+async def close_replicas() -> None:
+    """Закрыть пулы соединений реплик (вызывается при остановке приложения)"""
+    global replica_pool, replica_engines
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
+    replica_engines = []
+    replica_pool = None
+
+
+@event.listens_for(Session, "after_begin")
+def _bind_written_tables(session: Session, transaction, connection) -> None:
+    # Соединение транзакции пишет в множество своей сессии: так учитываются и ORM-flush,
+    # и Core-запросы через db.connection().execute / exec_driver_sql
+    connection.info[WRITTEN_TABLES] = session.info.setdefault(WRITTEN_TABLES, set())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _remember_written_tables(conn, cursor, statement: str, parameters, context, executemany) -> None:
+    tables = conn.info.get(WRITTEN_TABLES)
+    if tables is None or statement[:6].upper() == "SELECT":
+        return
+    tables.update(name.lower() for name in _WRITTEN_TABLE.findall(statement))
+
+
+@event.listens_for(Pool, "checkin")
+def _forget_written_tables(dbapi_connection, connection_record) -> None:
+    # Соединение вернулось в пул: следующая сессия начнёт с чистого множества
+    connection_record.info.pop(WRITTEN_TABLES, None)
+
+
+def _reads_written_tables(session: AsyncSession, statement: Executable) -> bool:
+    written = session.info.get(WRITTEN_TABLES)
+    if not written:
+        return False
+    return any(getattr(table, "name", None) in written for table in find_tables(statement, check_columns=True))
+
+
+async def execute_read(session: AsyncSession, statement: Executable, primary_on_empty: bool = False) -> Result:
+    """
+    Выполнить читающий запрос на реплике.
+
+    Если в этом запросе уже писали в затронутые таблицы, читаем с primary (read-your-writes).
+    При ошибке соединения пробуем следующую реплику, в конце — primary.
+    primary_on_empty — пустой ответ реплики перечитывается с primary: строка, записанная другим запросом
+    (вход сразу после регистрации), могла ещё не доехать до реплики.
+    Возвращённые ORM-объекты не привязаны к сессии: только для чтения.
+    """
+    if replica_pool is None or _reads_written_tables(session, statement):
+        return await session.execute(statement)
+
+    for index, session_factory in replica_pool.candidates():
+        try:
+            async with session_factory() as replica_session:
+                result = await replica_session.execute(statement)
+                if not primary_on_empty:
+                    return result
+                frozen = result.freeze()
+        except (OperationalError, InterfaceError, OSError, TimeoutError):
+            replica_pool.mark_down(index)
+            continue
+        if frozen.data:
+            return frozen()
+        break
+
+    return await session.execute(statement)
+
+
+@asynccontextmanager
+async def read_session(session: AsyncSession, statement: Executable) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия для долгого чтения (стриминг через серверный курсор): первая доступная реплика, иначе primary.
+
+    Переключиться на другую реплику посреди чтения нельзя, поэтому соединение проверяется до начала.
+    """
+    if replica_pool is not None and not _reads_written_tables(session, statement):
+        for index, session_factory in replica_pool.candidates():
+            replica_session = session_factory()
+            try:
+                await replica_session.connection()
+            except (OperationalError, InterfaceError, OSError, TimeoutError):
+                replica_pool.mark_down(index)
+                await replica_session.close()
+                continue
+            try:
+                yield replica_session
+            finally:
+                await replica_session.close()
+            return
+    yield session
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import uuid
+
+from redis.asyncio import Redis
+from sqlalchemy.sql import Executable
+
+from src.core.config import Settings
+from src.db import postgres
+from src.db.queries import (
+    login_conflict_stmt,
+    login_history_stmt,
+    role_by_name_stmt,
+    user_by_id_stmt,
+    user_by_identifier_stmt,
+    user_conflict_stmt,
+    user_profile_stmt,
+)
+
+logger = logging.getLogger(__name__)
+
+# Несуществующий id: запросы ничего не находят, но проходят разбор и планирование
+_DUMMY_ID = uuid.UUID(int=0)
+
+
+def hot_statements() -> list[Executable]:
+    """
+    Запросы горячего пути в том же виде, что и в сервисах.
+
+    asyncpg кэширует подготовленные выражения по тексту SQL на каждом соединении,
+    поэтому выражения берутся из src.db.queries — тех же, что выполняют сервисы.
+    """
+    return [
+        user_by_identifier_stmt(""),
+        user_conflict_stmt("", ""),
+        login_conflict_stmt("", _DUMMY_ID),
+        user_by_id_stmt(_DUMMY_ID),
+        role_by_name_stmt(""),
+        login_history_stmt(_DUMMY_ID),
+        user_profile_stmt(_DUMMY_ID),
+    ]
+
+
+async def _prime_connection(statements: list[Executable]) -> None:
+    async with postgres.async_session() as session:
+        for statement in statements:
+            await session.execute(statement)
+
+
+async def warm_up_database(connections: int) -> None:
+    """Открыть connections соединений пула одновременно и подготовить на каждом горячие запросы"""
+    statements = hot_statements()
+    # Сессии держатся параллельно, поэтому пул открывает отдельное соединение на каждую
+    await asyncio.gather(*(_prime_connection(statements) for _ in range(max(connections, 1))))
+
+
+async def warm_up(settings: Settings, redis: Redis) -> None:
+    """Прогреть БД и Redis, повторяя попытки, пока оба не ответят"""
+    while True:
+        try:
+            await redis.ping()
+            await warm_up_database(min(settings.warmup_connections, settings.database_pool_size))
+            return
+        except Exception:
+            logger.warning("Warm-up failed, retrying in %s s", settings.warmup_retry_seconds, exc_info=True)
+            await asyncio.sleep(settings.warmup_retry_seconds)
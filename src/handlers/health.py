@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import ORJSONResponse
+
+router = APIRouter()
+
+
+@router.get("/health", status_code=status.HTTP_200_OK)
+async def health():
+    """Liveness: процесс жив и обрабатывает запросы"""
+    return ORJSONResponse({"status": "ok"})
+
+
+@router.get("/ready", status_code=status.HTTP_200_OK)
+async def ready(request: Request):
+    """Readiness: 200 только после прогрева пула БД и Redis и до начала остановки"""
+    if not request.app.state.ready:
+        return ORJSONResponse({"status": "not_ready"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return ORJSONResponse({"status": "ready"})
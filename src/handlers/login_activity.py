@@ -0,0 +1,55 @@
+from datetime import date, datetime, timedelta
+from typing import Annotated
+
+from async_fastapi_jwt_auth import AuthJWT
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import ORJSONResponse
+from redis.asyncio import Redis
+
+from src.db.redis_db import get_redis
+from src.schemas.login_activity import LoginActivitySchema
+from src.schemas.serializers import serialize_many
+from src.services.login_activity import LoginActivityService, get_login_activity_service
+from src.services.token import TokenService, get_token_service, security_jwt
+from src.services.user_roles import roles_required
+
+router = APIRouter()
+
+DEFAULT_PERIOD = timedelta(days=30)
+# Дни в rollup-таблицах — даты login_time в UTC, поэтому и «сегодня» по умолчанию берётся в UTC
+
+
+@router.get("/{user_id}/login_activity", response_model=list[LoginActivitySchema], status_code=status.HTTP_200_OK)
+async def user_login_activity(
+    user_id: str,
+    token_service: Annotated[TokenService, Depends(get_token_service)],
+    login_activity_service: Annotated[LoginActivityService, Depends(get_login_activity_service)],
+    date_from: date | None = None,
+    date_to: date | None = None,
+    authorize: AuthJWT = Depends(),
+    redis: Redis = Depends(get_redis),
+    user: dict = Depends(security_jwt),
+):
+    """Количество входов пользователя по дням, типам устройств и статусам"""
+    await token_service.get_current_user_required(authorize, user_id)
+    await token_service.get_token_from_redis(authorize, redis)
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - DEFAULT_PERIOD
+    activity = await login_activity_service.get_user_activity(user_id, date_from, date_to)
+    return ORJSONResponse(serialize_many(LoginActivitySchema, activity))
+
+
+@router.get("/login_activity", response_model=list[LoginActivitySchema], status_code=status.HTTP_200_OK)
+@roles_required(["superuser"], scopes_list=["login_activity:read"])
+async def total_login_activity(
+    login_activity_service: Annotated[LoginActivityService, Depends(get_login_activity_service)],
+    date_from: date | None = None,
+    date_to: date | None = None,
+    authorize: AuthJWT = Depends(),
+    user: dict = Depends(security_jwt),
+):
+    """Количество входов всех пользователей по дням, типам устройств и статусам"""
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - DEFAULT_PERIOD
+    activity = await login_activity_service.get_total_activity(date_from, date_to)
+    return ORJSONResponse(serialize_many(LoginActivitySchema, activity))
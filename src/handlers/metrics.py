@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+
+from src.core.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики Prometheus, собранные со всех воркеров gunicorn"""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
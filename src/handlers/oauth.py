@@ -0,0 +1,93 @@
+import base64
+import binascii
+from typing import Optional
+from urllib.parse import parse_qsl, unquote
+
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import ORJSONResponse
+from redis.asyncio import Redis
+
+from exceptions import InvalidClient, InvalidScope
+from src.core.config import get_settings
+from src.db.redis_db import get_redis
+from src.services.client_credentials import ClientCredentialsService, get_client_credentials_service
+
+router = APIRouter()
+
+# Ответ с токеном не должен оседать в кэшах прокси (RFC 6749 §5.1)
+NO_STORE = {"Cache-Control": "no-store", "Pragma": "no-cache"}
+
+TOKEN_REQUEST_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/x-www-form-urlencoded": {
+                "schema": {
+                    "type": "object",
+                    "required": ["grant_type"],
+                    "properties": {
+                        "grant_type": {"type": "string", "enum": ["client_credentials"]},
+                        "scope": {"type": "string", "description": "scope через пробел"},
+                        "client_id": {"type": "string", "description": "если не передан заголовок Basic"},
+                        "client_secret": {"type": "string"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+def oauth_error(error: str, description: str, status_code: int = status.HTTP_400_BAD_REQUEST) -> ORJSONResponse:
+    """Ошибка в формате RFC 6749 §5.2"""
+    headers = dict(NO_STORE)
+    if error == "invalid_client":
+        headers["WWW-Authenticate"] = 'Basic realm="oauth"'
+    return ORJSONResponse({"error": error, "error_description": description}, status_code=status_code, headers=headers)
+
+
+def basic_credentials(request: Request) -> Optional[tuple[str, str]]:
+    """client_id и client_secret из заголовка Authorization: Basic (RFC 6749 §2.3.1)"""
+    scheme, _, encoded = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "basic" or not encoded:
+        return None
+    try:
+        decoded = base64.b64decode(encoded, validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    client_id, separator, client_secret = decoded.partition(":")
+    if not separator:
+        return None
+    return unquote(client_id), unquote(client_secret)
+
+
+@router.post("/oauth/token", openapi_extra=TOKEN_REQUEST_SCHEMA)
+async def issue_token(
+    request: Request,
+    client_credentials_service: ClientCredentialsService = Depends(get_client_credentials_service),
+    redis: Redis = Depends(get_redis),
+):
+    """Токен сервиса по client credentials (OAuth2, RFC 6749 §4.4)"""
+    # Тело разбирается вручную: форма из четырёх полей не стоит зависимости python-multipart
+    if request.headers.get("Content-Type", "").split(";")[0].strip() != "application/x-www-form-urlencoded":
+        return oauth_error("invalid_request", "Ожидается application/x-www-form-urlencoded")
+    form = dict(parse_qsl((await request.body()).decode(errors="replace")))
+    if form.get("grant_type") != "client_credentials":
+        return oauth_error("unsupported_grant_type", "Поддерживается только grant_type=client_credentials")
+
+    credentials = basic_credentials(request)
+    if credentials is None:
+        credentials = form.get("client_id"), form.get("client_secret")
+    client_id, client_secret = credentials
+    if not client_id or not client_secret:
+        return oauth_error("invalid_client", InvalidClient.detail, status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        token = await client_credentials_service.issue_token(
+            redis, get_settings(), client_id, client_secret, form.get("scope")
+        )
+    except InvalidClient as exc:
+        return oauth_error("invalid_client", exc.detail, status.HTTP_401_UNAUTHORIZED)
+    except InvalidScope as exc:
+        return oauth_error("invalid_scope", exc.detail)
+    return ORJSONResponse(token, headers=NO_STORE)
@@ -1,11 +1,19 @@
 from async_fastapi_jwt_auth import AuthJWT
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from exceptions import RoleNotFound
+from src.core.config import get_settings
 from src.db.postgres import get_session
+from src.db.redis_db import get_redis
 from src.models.user import Role
-from src.schemas.user_roles import RoleCreateSchema, RoleInDBSchema
+from src.schemas.serializers import serialize
+from src.schemas.user_roles import RoleAssignResultSchema, RoleAssignSchema, RoleCreateSchema, RoleInDBSchema
+from src.services.outbox import ROLE_CREATED, add_outbox_event
+from src.services.role_assignment import RoleAssignmentService, get_role_assignment_service
 from src.services.token import security_jwt
 from src.services.user_roles import roles_required
 
@@ -24,6 +32,32 @@ async def create_role(
     role_dto = jsonable_encoder(role_create)
     role = Role(**role_dto)
     db.add(role)
+    await db.flush()
+    add_outbox_event(db, ROLE_CREATED, {"role_id": str(role.id), "name": role.name, "created_by": user.get("sub")})
     await db.commit()
     await db.refresh(role)
-    return role
+    return ORJSONResponse(serialize(RoleInDBSchema, role), status_code=status.HTTP_201_CREATED)
+
+
+@router.post("/role/assign", response_model=RoleAssignResultSchema)
+@roles_required(["superuser"])
+async def assign_role(
+    role_assign: RoleAssignSchema,
+    role_assignment_service: RoleAssignmentService = Depends(get_role_assignment_service),
+    redis: Redis = Depends(get_redis),
+    authorize: AuthJWT = Depends(),
+    user: dict = Depends(security_jwt),
+) -> RoleAssignResultSchema:
+    """Массовая смена роли пользователям из списка или по фильтру"""
+    try:
+        report = await role_assignment_service.reassign(
+            redis,
+            role_assign.role,
+            get_settings().role_assignment_chunk_size,
+            user_ids=role_assign.user_ids,
+            query=role_assign.query,
+            from_role=role_assign.from_role,
+        )
+    except RoleNotFound as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=exc.detail)
+    return ORJSONResponse(report)
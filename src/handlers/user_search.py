@@ -0,0 +1,41 @@
+from typing import Annotated
+
+from async_fastapi_jwt_auth import AuthJWT
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
+
+from src.schemas.serializers import serialize_many
+from src.schemas.users import UserSearchItemSchema, UserSearchPageSchema
+from src.services.token import security_jwt
+from src.services.user_roles import roles_required
+from src.services.user_search import MIN_QUERY_LENGTH, UserSearchService, get_user_search_service
+
+router = APIRouter()
+
+
+@router.get("/users", response_model=UserSearchPageSchema, status_code=status.HTTP_200_OK)
+@roles_required(["superuser"], scopes_list=["users:read"])
+async def search_users(
+    user_search_service: Annotated[UserSearchService, Depends(get_user_search_service)],
+    q: str | None = Query(None, min_length=MIN_QUERY_LENGTH, description="Часть логина, email, имени или фамилии"),
+    role: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    authorize: AuthJWT = Depends(),
+    user: dict = Depends(security_jwt),
+):
+    """
+    Поиск пользователей (superuser или сервис со scope users:read): keyset-пагинация по логину
+    и оценка общего числа
+    """
+    try:
+        rows, next_cursor, total = await user_search_service.search(q, role, limit, cursor)
+    except ValueError as ex:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex))
+    return ORJSONResponse(
+        {
+            "items": serialize_many(UserSearchItemSchema, rows),
+            "next_cursor": next_cursor,
+            "total_estimate": total,
+        }
+    )
@@ -1,14 +1,19 @@
-from typing import Annotated
+import time
+from typing import Annotated, Literal
+from uuid import UUID
 
 from async_fastapi_jwt_auth import AuthJWT
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse
 from redis.asyncio import Redis
 
-from exceptions import UserNotFound, UserInDB
+from exceptions import AccountNotFound, OAuthProviderError, OAuthStateInvalid, UserNotFound, UserInDB
+from src.core.config import get_settings
+from src.db import redis_db
 from src.db.redis_db import get_redis
+from src.schemas.login_history import LoginHistoryResponseSchema
+from src.schemas.serializers import serialize, serialize_many
 from src.schemas.users import (
-    TokenSchema,
     UserAuthSchema,
     UserCreateSchema,
     UserInDBSchema,
@@ -16,13 +21,33 @@ from src.schemas.users import (
     UserSchema,
     AuthResponse,
 )
-from src.services.login_history import LoginHistoryService, get_login_history
-from src.services.token import TokenService, get_token_service, security_jwt
+from src.services.login_history import EXPORT_MEDIA_TYPES, LoginHistoryService, get_login_history
+from src.services.role_assignment import role_changed_since
+from src.services.social_auth import SocialAuthService, get_social_auth_service
+from src.services.token import TokenService, get_token_claims, get_token_service, security_jwt
 from src.services.user import UserService, get_user_service
+from src.services.user_deletion import UserDeletionService, finish_deletion, get_user_deletion_service
 
 router = APIRouter()
 
 
+async def require_self_or_superuser(authorize: AuthJWT, user_id: str) -> dict:
+    """Свои данные — любому пользователю, чужие — только superuser"""
+    claims = await get_token_claims(authorize)
+    # Токен сервиса не даёт доступа к данным пользователей: его sub — client_id, а не пользователь
+    if claims.get("client_id"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="У вас нет прав на доступ к данным этого пользователя"
+        )
+    if claims.get("sub") != user_id and (
+        claims.get("role") != "superuser" or await role_changed_since(redis_db.redis, claims)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="У вас нет прав на доступ к данным этого пользователя"
+        )
+    return claims
+
+
 @router.post("/signup", response_model=UserInDBSchema, status_code=status.HTTP_201_CREATED)
 async def create_user(
     user_create: UserCreateSchema, user_service: Annotated[UserService, Depends(get_user_service)]
@@ -31,7 +56,7 @@ async def create_user(
         user = await user_service.create_user(user_create)
     except UserInDB as ex:
         raise HTTPException(status_code=404, detail=ex.detail)
-    return user
+    return ORJSONResponse(serialize(UserInDBSchema, user), status_code=status.HTTP_201_CREATED)
 
 
 @router.post("/auth", response_model=AuthResponse, status_code=status.HTTP_200_OK)
@@ -49,9 +74,9 @@ async def auth_user(
         raise HTTPException(status_code=404, detail=ex.detail)
     access_token = await token_service.generate_access_token(str(user_orm.id), authorize)
     refresh_token = await token_service.generate_refresh_token(str(user_orm.id), authorize)
-    token = TokenSchema(access_token=access_token, refresh_token=refresh_token)
-    user = UserSchema.from_orm(user_orm)
-    return AuthResponse(token=token, user=user)
+    # Ответ собирается напрямую из ORM-объекта, без повторной валидации через AuthResponse
+    token = {"access_token": access_token, "refresh_token": refresh_token}
+    return ORJSONResponse({"token": token, "user": serialize(UserSchema, user_orm)})
 
 
 @router.patch("/{user_id}/update", response_model=UserInDBSchema, status_code=status.HTTP_200_OK)
@@ -65,7 +90,13 @@ async def update_user(
     user: dict = Depends(security_jwt),
 ):
     current_user = await token_service.get_current_user_required(authorize, user_id)
-    return await user_service.update_user(user_id, update_data, current_user, authorize, redis, token_service)
+    try:
+        updated_user = await user_service.update_user(
+            user_id, update_data, current_user, authorize, redis, token_service
+        )
+    except UserInDB as ex:
+        raise HTTPException(status_code=404, detail=ex.detail)
+    return ORJSONResponse(serialize(UserInDBSchema, updated_user))
 
 
 @router.post("/{user_id}/logout", status_code=status.HTTP_200_OK)
@@ -81,7 +112,11 @@ async def logout_user(
     return await user_service.logout_user(user_id, current_user, authorize, redis, token_service)
 
 
-@router.get("/{user_id}/login_history", status_code=status.HTTP_200_OK)
+@router.get(
+    "/{user_id}/login_history",
+    response_model=list[LoginHistoryResponseSchema] | None,
+    status_code=status.HTTP_200_OK,
+)
 async def login_history(
     user_id: str,
     token_service: Annotated[TokenService, Depends(get_token_service)],
@@ -92,16 +127,97 @@ async def login_history(
 ):
     await token_service.get_current_user_required(authorize, user_id)
     history = await login_history_service.get_login_history(user_id, token_service, authorize, redis)
-    return history
+    return ORJSONResponse(serialize_many(LoginHistoryResponseSchema, history) if history else None)
+
+
+@router.get("/{user_id}/login_history/export", response_class=StreamingResponse, status_code=status.HTTP_200_OK)
+async def export_login_history(
+    user_id: str,
+    request: Request,
+    token_service: Annotated[TokenService, Depends(get_token_service)],
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    authorize: AuthJWT = Depends(),
+    redis: Redis = Depends(get_redis),
+    login_history_service: LoginHistoryService = Depends(get_login_history),
+    user: dict = Depends(security_jwt),
+):
+    """Выгрузка всей истории входов потоком (свою — пользователю, любую — superuser); gzip по Accept-Encoding"""
+    await token_service.get_token_from_redis(authorize, redis)
+    await require_self_or_superuser(authorize, user_id)
+
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    chunks = await login_history_service.export_login_history(
+        user_id, export_format, compress, get_settings().login_history_export_batch_size
+    )
+    headers = {
+        "Content-Disposition": f'attachment; filename="login_history_{user_id}.{export_format}"',
+        "Vary": "Accept-Encoding",
+        # nginx не буферизует ответ целиком: клиент получает строки по мере чтения из БД
+        "X-Accel-Buffering": "no",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=EXPORT_MEDIA_TYPES[export_format], headers=headers)
+
+
+@router.delete("/{user_id}", status_code=status.HTTP_200_OK)
+async def delete_user(
+    user_id: UUID,
+    background_tasks: BackgroundTasks,
+    token_service: Annotated[TokenService, Depends(get_token_service)],
+    user_deletion_service: Annotated[UserDeletionService, Depends(get_user_deletion_service)],
+    authorize: AuthJWT = Depends(),
+    redis: Redis = Depends(get_redis),
+    user: dict = Depends(security_jwt),
+):
+    """
+    Удаление аккаунта (своего или, для superuser, любого). Вход закрывается и токены отзываются сразу;
+    если история входов не успела удалиться за user_deletion_budget_seconds, удаление заканчивается в фоне (202)
+    """
+    await token_service.get_token_from_redis(authorize, redis)
+    await require_self_or_superuser(authorize, str(user_id))
+    settings = get_settings()
+    try:
+        await user_deletion_service.lock_out(redis, user_id)
+    except AccountNotFound as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=exc.detail)
+
+    deadline = time.monotonic() + settings.user_deletion_budget_seconds
+    if await user_deletion_service.purge(user_id, settings.user_deletion_batch_size, deadline):
+        return ORJSONResponse({"message": "Аккаунт удалён"})
+    background_tasks.add_task(finish_deletion, user_id, settings.user_deletion_batch_size)
+    return ORJSONResponse({"message": "Аккаунт удаляется"}, status_code=status.HTTP_202_ACCEPTED)
 
 
 @router.post("/auth/yandex", response_class=RedirectResponse)
-async def yandex_auth(user_service: Annotated[UserService, Depends(get_user_service)]):
-    redirect_url = await user_service.get_yandex_redirect_url()
+async def yandex_auth(
+    social_auth_service: Annotated[SocialAuthService, Depends(get_social_auth_service)],
+    redis: Redis = Depends(get_redis),
+):
+    redirect_url = await social_auth_service.start_yandex_login(redis)
     return RedirectResponse(redirect_url)
 
 
-@router.get("/auth/yandex/callback")
-async def yandex_auth_callback(code: str, user_service: Annotated[UserService, Depends(get_user_service)]):
-    user_info = await user_service.get_user_info(code)
-    return user_info
+@router.get("/auth/yandex/callback", response_model=AuthResponse, status_code=status.HTTP_200_OK)
+async def yandex_auth_callback(
+    code: str,
+    state: str,
+    social_auth_service: Annotated[SocialAuthService, Depends(get_social_auth_service)],
+    login_history_service: Annotated[LoginHistoryService, Depends(get_login_history)],
+    token_service: Annotated[TokenService, Depends(get_token_service)],
+    request: Request,
+    authorize: AuthJWT = Depends(),
+    redis: Redis = Depends(get_redis),
+):
+    """Завершение входа через Яндекс: та же пара токенов, что и у /auth, но без проверки пароля"""
+    try:
+        user_orm = await social_auth_service.complete_yandex_login(redis, code, state)
+    except OAuthStateInvalid as ex:
+        raise HTTPException(status_code=400, detail=ex.detail)
+    except OAuthProviderError as ex:
+        raise HTTPException(status_code=502, detail=ex.detail)
+    await login_history_service.create_login_history_from_request(request, user_orm.id)
+    access_token = await token_service.generate_access_token(str(user_orm.id), authorize)
+    refresh_token = await token_service.generate_refresh_token(str(user_orm.id), authorize)
+    token = {"access_token": access_token, "refresh_token": refresh_token}
+    return ORJSONResponse({"token": token, "user": serialize(UserSchema, user_orm)})
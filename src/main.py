@@ -1,39 +1,83 @@
+import asyncio
 import uuid
 from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
 
 from async_fastapi_jwt_auth import AuthJWT
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
-from opentelemetry import trace
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
-from opentelemetry.semconv.resource import ResourceAttributes
-from redis.asyncio import Redis
 from fastapi import Request
 
-from src.core.config import settings
-from src.db import redis_db
+from src.core.config import Settings, get_settings
+from src.core.admission import AdmissionMiddleware, load_signals
+from src.core.idempotency import IdempotencyMiddleware
+from src.core.metrics import MetricsMiddleware
+from src.db import postgres, redis_db, replicas
+from src.db.warmup import warm_up
+from src.handlers.health import router as health_router
+from src.handlers.login_activity import router as login_activity_router
+from src.handlers.metrics import router as metrics_router
+from src.handlers.oauth import router as oauth_router
 from src.handlers.user_roles import router as user_role_router
+from src.handlers.user_search import router as user_search_router
 from src.handlers.users import router as user_router
+from src.services.revocation import get_revocation_checker
 
-
-@AuthJWT.load_config
-def get_config():
-    return settings
+if TYPE_CHECKING:
+    from opentelemetry.sdk.trace import TracerProvider
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    redis_db.redis = Redis(host=settings.redis_host, port=settings.redis_port, db=0, decode_responses=True)
+    # Startup: всё тяжёлое создаётся здесь, а не при импорте модуля
+    app.state.ready = False
+    settings = get_settings()
+    app.title = settings.projrct_name
+    AuthJWT.load_config(get_settings)
+    tracer_provider = configure_tracer(settings)
+    postgres.init_engine(settings)
+    replicas.init_replicas(settings)
+    redis_db.redis = redis_db.InstrumentedRedis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        db=0,
+        decode_responses=True,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_timeout,
+    )
+    # Снимок отозванных токенов на случай недоступности Redis
+    snapshot_task = asyncio.create_task(get_revocation_checker().refresh_snapshot_periodically(redis_db.redis))
+    # Прогрев идёт в фоне: процесс уже отвечает на /health, а /ready вернёт 200 только после прогрева
+    warmup_task = asyncio.create_task(warm_up_and_mark_ready(app, settings))
+    loop_lag_task = asyncio.create_task(load_signals.monitor_loop_lag(settings.admission_loop_lag_interval_seconds))
     yield
-    # Shutdown
+    # Shutdown: сервер уже перестал принимать соединения и дождался текущих запросов
+    app.state.ready = False
+    for task in (warmup_task, snapshot_task, loop_lag_task):
+        task.cancel()
+    await asyncio.gather(warmup_task, snapshot_task, loop_lag_task, return_exceptions=True)
+    await redis_db.redis.aclose()
+    await replicas.close_replicas()
+    await postgres.close_engine()
+    # Отправить накопленные спаны до выхода процесса
+    tracer_provider.shutdown()
+
+
+async def warm_up_and_mark_ready(app: FastAPI, settings: Settings) -> None:
+    await warm_up(settings, redis_db.redis)
+    app.state.ready = True
+
+
+def configure_tracer(settings: Settings) -> "TracerProvider":
+    # Экспортёры импортируются лениво: thrift/jaeger заметно замедляют импорт приложения
+    from opentelemetry import trace
+    from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.semconv.resource import ResourceAttributes
 
-
-def configure_tracer() -> None:
     resource = Resource.create(
         {
             ResourceAttributes.SERVICE_NAME: "auth-service",
@@ -45,23 +89,21 @@ def configure_tracer() -> None:
     tracer_provider.add_span_processor(
         BatchSpanProcessor(
             JaegerExporter(
-                agent_host_name="localhost",
-                agent_port=6831,
+                agent_host_name=settings.jaeger_host,
+                agent_port=settings.jaeger_port,
             )
         )
     )
     # Чтобы видеть трейсы в консоли
-    tracer_provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+    if settings.tracing_console_export:
+        tracer_provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
 
     trace.set_tracer_provider(tracer_provider)
-
-
-configure_tracer()
+    return tracer_provider
 
 
 # Сначала создаем app
 app = FastAPI(
-    title=settings.projrct_name,
     docs_url="/openapi",
     openapi_url="/openapi.json",
     default_response_class=ORJSONResponse,
@@ -70,6 +112,11 @@ app = FastAPI(
 
 FastAPIInstrumentor.instrument_app(app)
 
+# Добавляется до before_request, чтобы X-Request-Id проставлялся и сохранённым ответам
+app.add_middleware(IdempotencyMiddleware)
+# Отбрасывать лишнее до того, как запрос займёт блокировку идемпотентности и соединение с БД
+app.add_middleware(AdmissionMiddleware)
+
 
 @app.middleware("http")
 async def before_request(request: Request, call_next):
@@ -88,5 +135,14 @@ async def before_request(request: Request, call_next):
     return response
 
 
+# Регистрируется последним и потому внешний слой: в латентность входят все остальные middleware
+app.add_middleware(MetricsMiddleware)
+
+
+app.include_router(health_router, prefix="", tags=["health"])
+app.include_router(metrics_router, prefix="", tags=["health"])
 app.include_router(user_router, prefix="", tags=["user"])
 app.include_router(user_role_router, prefix="", tags=["user_role"])
+app.include_router(login_activity_router, prefix="", tags=["login_activity"])
+app.include_router(user_search_router, prefix="", tags=["admin"])
+app.include_router(oauth_router, prefix="", tags=["oauth"])
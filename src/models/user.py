@@ -1,12 +1,34 @@
+import time
 import uuid
 from datetime import datetime
 
 from passlib.context import CryptContext
-from sqlalchemy import UUID, Column, DateTime, ForeignKey, String
+from sqlalchemy import UUID, BigInteger, Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base, relationship
 
+from src.core.metrics import PASSWORD_HASH, PASSWORD_VERIFY
+
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
+# Пароль пользователей, созданных через OAuth: не совпадает ни с одним хэшем, войти по паролю нельзя
+UNUSABLE_PASSWORD = "!"
+
+
+def hash_password(password: str) -> str:
+    start = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    PASSWORD_HASH.observe(time.perf_counter() - start)
+    return hashed
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    start = time.perf_counter()
+    verified = pwd_context.verify(password, hashed)
+    PASSWORD_VERIFY.observe(time.perf_counter() - start)
+    return verified
+
+
 # Создаём базовый класс для будущих моделей
 Base = declarative_base()
 
@@ -39,21 +61,53 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     role = relationship("Role", back_populates="users")
-    login_histories = relationship("LoginHistory", back_populates="user", cascade="all, delete-orphan")
+    # passive_deletes: при удалении пользователя связанные строки не загружаются, их удаляет ON DELETE CASCADE
+    login_histories = relationship(
+        "LoginHistory", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
+    social_accounts = relationship(
+        "SocialAccount", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    # Вход по email или логину без учёта регистра: UserService ищет по lower(email) и lower(login)
+    # Поиск администратора: ILIKE '%...%' по триграммным GIN-индексам (pg_trgm), фильтр по роли — по role_id
+    __table_args__ = (
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+        Index("ix_users_login_lower", func.lower(login), unique=True),
+        Index("ix_users_login_trgm", "login", postgresql_using="gin", postgresql_ops={"login": "gin_trgm_ops"}),
+        Index("ix_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+        Index(
+            "ix_users_first_name_trgm",
+            "first_name",
+            postgresql_using="gin",
+            postgresql_ops={"first_name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_users_last_name_trgm",
+            "last_name",
+            postgresql_using="gin",
+            postgresql_ops={"last_name": "gin_trgm_ops"},
+        ),
+        Index("ix_users_role_id", "role_id"),
+    )
 
-    def __init__(self, login: str, email: str, password: str, first_name: str, last_name: str, role_id: UUID) -> None:
+    def __init__(
+        self, login: str, email: str, password: str | None, first_name: str, last_name: str, role_id: UUID
+    ) -> None:
         self.login = login
         self.email = email
-        self.password = pwd_context.hash(password)
+        self.password = hash_password(password) if password is not None else UNUSABLE_PASSWORD
         self.first_name = first_name
         self.last_name = last_name
         self.role_id = role_id
 
     def check_password(self, password: str) -> bool:
-        return pwd_context.verify(password, self.password)
+        if self.password == UNUSABLE_PASSWORD:
+            return False
+        return verify_password(password, self.password)
 
     def set_password(self, password: str) -> None:
-        self.password = pwd_context.hash(password)
+        self.password = hash_password(password)
 
     def __repr__(self) -> str:
         return f"<User {self.email}>"
@@ -70,6 +124,13 @@ class LoginHistory(Base):
     device_type = Column(String(50))
     login_status = Column(String(20), default="success", nullable=False)
 
+    __table_args__ = (
+        # Индекс по времени входа нужен для инкрементального пересчёта rollup по окнам
+        Index("ix_login_history_login_time", "login_time"),
+        # История одного пользователя в порядке входов читается по индексу без сортировки
+        Index("ix_login_history_user_id_login_time", "user_id", "login_time"),
+    )
+
     # Связь с пользователем
     user = relationship("User", back_populates="login_histories")
 
@@ -89,3 +150,124 @@ class LoginHistory(Base):
 
     def __repr__(self) -> str:
         return f"LoginHistory {self.login_time} - {self.login_status}"
+
+
+class SocialAccount(Base):
+    """Аккаунт внешнего OAuth-провайдера, привязанный к пользователю"""
+
+    __tablename__ = "social_accounts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    provider = Column(String(50), nullable=False)
+    external_id = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Пользователь по аккаунту провайдера находится одним поиском по уникальному индексу
+    __table_args__ = (
+        Index("ix_social_accounts_provider_external_id", "provider", "external_id", unique=True),
+        Index("ix_social_accounts_user_id", "user_id"),
+    )
+
+    user = relationship("User", back_populates="social_accounts")
+
+    def __init__(self, user_id: uuid.UUID, provider: str, external_id: str) -> None:
+        self.user_id = user_id
+        self.provider = provider
+        self.external_id = external_id
+
+    def __repr__(self) -> str:
+        return f"SocialAccount {self.provider}:{self.external_id}"
+
+
+class ServiceClient(Base):
+    """Внутренний сервис, получающий токены по client credentials (OAuth2, RFC 6749 §4.4)"""
+
+    __tablename__ = "service_clients"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
+    client_id = Column(String(64), unique=True, nullable=False)
+    secret_hash = Column(String(255), nullable=False)
+    name = Column(String(255), nullable=False)
+    # Разрешённые scope через пробел, как в параметре scope запроса токена
+    scopes = Column(String(1024), nullable=False, default="")
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __init__(self, client_id: str, secret: str, name: str, scopes: str) -> None:
+        self.client_id = client_id
+        self.secret_hash = hash_password(secret)
+        self.name = name
+        self.scopes = scopes
+
+    def check_secret(self, secret: str) -> bool:
+        return verify_password(secret, self.secret_hash)
+
+    def set_secret(self, secret: str) -> None:
+        self.secret_hash = hash_password(secret)
+
+    def __repr__(self) -> str:
+        return f"ServiceClient {self.client_id}"
+
+
+class LoginActivityDaily(Base):
+    """Суточные счётчики входов пользователя, поддерживаются инкрементально по login_history"""
+
+    __tablename__ = "login_activity_daily"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    device_type = Column(String(50), primary_key=True)
+    login_status = Column(String(20), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"LoginActivityDaily {self.user_id} {self.day} {self.device_type}/{self.login_status}: {self.count}"
+
+
+class LoginActivityDailyTotal(Base):
+    """Суточные счётчики входов по всем пользователям"""
+
+    __tablename__ = "login_activity_daily_total"
+
+    day = Column(Date, primary_key=True)
+    device_type = Column(String(50), primary_key=True)
+    login_status = Column(String(20), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"LoginActivityDailyTotal {self.day} {self.device_type}/{self.login_status}: {self.count}"
+
+
+class RollupWatermark(Base):
+    """До какого момента login_history уже учтена в rollup-таблицах"""
+
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"RollupWatermark {self.name}: {self.value}"
+
+
+class OutboxEvent(Base):
+    """Событие для внешних сервисов, записывается в той же транзакции, что и изменение данных"""
+
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    event_type = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    published_at = Column(DateTime)
+
+    # Relay выбирает только неопубликованные события в порядке id
+    __table_args__ = (Index("ix_outbox_events_unpublished", "id", postgresql_where=published_at.is_(None)),)
+
+    def __init__(self, event_type: str, payload: dict) -> None:
+        self.event_type = event_type
+        self.payload = payload
+
+    def __repr__(self) -> str:
+        return f"OutboxEvent {self.id} {self.event_type}"
@@ -0,0 +1,12 @@
+from datetime import date
+
+from pydantic import BaseModel, ConfigDict
+
+
+class LoginActivitySchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    day: date
+    device_type: str
+    login_status: str
+    count: int
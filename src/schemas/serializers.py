@@ -0,0 +1,37 @@
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Iterable
+
+from pydantic import BaseModel
+
+Serializer = Callable[[Any], dict]
+
+
+@lru_cache
+def get_serializer(schema: type[BaseModel]) -> Serializer:
+    """
+    Сериализатор ORM-объекта в словарь, готовый для orjson, по полям pydantic-схемы.
+
+    Строится один раз на схему. Атрибуты читаются напрямую, без повторной валидации pydantic:
+    UUID и datetime orjson кодирует сам. Подходит для плоских схем с from_attributes.
+    """
+    fields = tuple(schema.model_fields)
+    getter = attrgetter(*fields)
+
+    if len(fields) == 1:
+        (field,) = fields
+        return lambda obj: {field: getter(obj)}
+
+    def serialize(obj: Any) -> dict:
+        return dict(zip(fields, getter(obj)))
+
+    return serialize
+
+
+def serialize(schema: type[BaseModel], obj: Any) -> dict:
+    return get_serializer(schema)(obj)
+
+
+def serialize_many(schema: type[BaseModel], objs: Iterable[Any]) -> list[dict]:
+    serializer = get_serializer(schema)
+    return [serializer(obj) for obj in objs]
@@ -1,6 +1,6 @@
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class RoleInDBSchema(BaseModel):
@@ -14,3 +14,26 @@ class RoleInDBSchema(BaseModel):
 class RoleCreateSchema(BaseModel):
     name: str = Field(max_length=50)
     description: str = Field(max_length=255)
+
+
+class RoleAssignSchema(BaseModel):
+    role: str = Field(max_length=50)
+    # Явный список пользователей или фильтр: подстрока логина/email/имени и текущая роль
+    user_ids: list[UUID] | None = None
+    query: str | None = Field(None, min_length=3)
+    from_role: str | None = None
+
+    @model_validator(mode="after")
+    def check_target(self) -> "RoleAssignSchema":
+        # Без фильтра роль сменилась бы у всех пользователей
+        if self.user_ids is None and not self.query and not self.from_role:
+            raise ValueError("Укажите user_ids, query или from_role")
+        return self
+
+
+class RoleAssignResultSchema(BaseModel):
+    role: str
+    matched: int
+    updated: int
+    chunks: int
+    not_invalidated: int
@@ -55,3 +55,23 @@ class AuthResponse(BaseModel):
 
     class Config:
         arbitrary_types_allowed = True
+
+
+class UserSearchItemSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    login: str
+    email: str
+    first_name: str | None
+    last_name: str | None
+    role: str
+    created_at: datetime | None
+
+
+class UserSearchPageSchema(BaseModel):
+    items: list[UserSearchItemSchema]
+    # Курсор следующей страницы, None — страница последняя
+    next_cursor: str | None
+    # Оценка планировщика, а не точный COUNT(*)
+    total_estimate: int
@@ -0,0 +1,210 @@
+import hashlib
+import hmac
+import logging
+import re
+import secrets
+import time
+from typing import Optional
+
+import orjson
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from exceptions import InvalidClient, InvalidScope
+from src.core.config import Settings
+from src.core.metrics import CLIENT_TOKEN_CACHED, CLIENT_TOKEN_ISSUED, CLIENT_TOKEN_REJECTED
+from src.db.postgres import get_session
+from src.models.user import ServiceClient
+from src.services.opaque_token import issue_opaque_token
+from src.services.revocation import get_revocation_checker
+from src.services.single_flight import SingleFlight
+from src.services.token import opaque_mode
+from src.services.token_issuer import get_token_issuer
+
+logger = logging.getLogger(__name__)
+
+# client_token:<client_id>:<scope> — уже выданный токен клиента для набора scope, TTL — до его «устаревания»
+CLIENT_TOKEN_PREFIX = "client_token:"
+CLIENT_ID_PREFIX = "svc_"
+
+_SCOPE_TOKEN = re.compile(r"^[A-Za-z0-9:._/-]+$")
+
+# Выпуски токенов, идущие в этом воркере, по (client_id, scope, отпечаток секрета)
+_flights = SingleFlight()
+
+
+def normalize_scope(scope: Optional[str]) -> str:
+    """Scope через пробел без повторов и в одном порядке: от порядка в запросе не зависит ключ кэша"""
+    scopes = sorted(set((scope or "").split()))
+    if any(not _SCOPE_TOKEN.match(item) for item in scopes):
+        raise InvalidScope
+    return " ".join(scopes)
+
+
+def secret_digest(client_secret: str) -> str:
+    """
+    Быстрый отпечаток секрета для сверки с токеном в кэше.
+
+    Секрет — 256 случайных бит, перебор по быстрому хэшу ему не грозит; медленный хэш в базе
+    проверяется только при выпуске нового токена.
+    """
+    return hashlib.sha256(client_secret.encode()).hexdigest()
+
+
+def generate_client_credentials() -> tuple[str, str]:
+    return CLIENT_ID_PREFIX + secrets.token_hex(8), secrets.token_urlsafe(32)
+
+
+class ClientCredentialsService:
+    """
+    Токены сервисов по OAuth2 client credentials: короткоживущие, с набором scope.
+
+    Выданный токен кэшируется в Redis на пару (клиент, scope) вместе с отпечатком секрета: пока до его
+    истечения остаётся не меньше client_token_min_remaining_seconds, повторный запрос с тем же секретом
+    получает его без обращения к базе, проверки медленного хэша и новой подписи. Одновременные промахи
+    в пределах воркера объединяются (single-flight), а между воркерами побеждает первая запись (SET NX).
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def issue_token(
+        self, redis: Redis, settings: Settings, client_id: str, client_secret: str, scope: Optional[str]
+    ) -> dict:
+        requested = normalize_scope(scope)
+        digest = secret_digest(client_secret)
+        key = CLIENT_TOKEN_PREFIX + client_id + ":" + requested
+
+        cached = await self._cached_token(redis, key, digest)
+        if cached is not None:
+            CLIENT_TOKEN_CACHED.inc()
+            return cached
+
+        return await _flights.run(
+            (client_id, requested, digest),
+            lambda: self._issue(redis, settings, key, digest, client_id, client_secret, requested),
+        )
+
+    async def _cached_token(self, redis: Redis, key: str, digest: str) -> Optional[dict]:
+        try:
+            raw = await redis.get(key)
+        except (RedisError, OSError):
+            logger.warning("Кэш токенов сервисов недоступен, выпускаем новый", exc_info=True)
+            return None
+        if raw is None:
+            return None
+        entry = orjson.loads(raw)
+        if not hmac.compare_digest(entry["secret"], digest):
+            return None
+        return _token_response(entry, int(time.time()))
+
+    async def _issue(
+        self,
+        redis: Redis,
+        settings: Settings,
+        key: str,
+        digest: str,
+        client_id: str,
+        client_secret: str,
+        requested: str,
+    ) -> dict:
+        result = await self.db.execute(
+            select(ServiceClient).where(ServiceClient.client_id == client_id, ServiceClient.is_active.is_(True))
+        )
+        client = result.scalar_one_or_none()
+        if client is None or not client.check_secret(client_secret):
+            CLIENT_TOKEN_REJECTED.inc()
+            raise InvalidClient
+
+        allowed = set(client.scopes.split())
+        granted = requested or " ".join(sorted(allowed))
+        if not set(granted.split()) <= allowed:
+            CLIENT_TOKEN_REJECTED.inc()
+            raise InvalidScope
+
+        ttl = settings.client_token_ttl_seconds
+        claims = {"client_id": client_id, "scope": granted, "token_type": "access"}
+        if opaque_mode():
+            token = await issue_opaque_token(redis, {"sub": client_id, **claims}, ttl)
+        else:
+            token = get_token_issuer().issue(
+                subject=client_id, token_type="access", expires_time=ttl, user_claims=claims
+            )
+        CLIENT_TOKEN_ISSUED.inc()
+
+        now = int(time.time())
+        entry = {"token": token, "scope": granted, "exp": now + ttl, "secret": digest}
+        cache_ttl = ttl - settings.client_token_min_remaining_seconds
+        if cache_ttl > 0:
+            try:
+                stored = await redis.set(key, orjson.dumps(entry), ex=cache_ttl, nx=True)
+                if not stored:
+                    # Другой воркер успел раньше: все экземпляры сервиса получают один и тот же токен
+                    winner = await self._cached_token(redis, key, digest)
+                    if winner is not None:
+                        return winner
+            except (RedisError, OSError):
+                logger.warning("Не удалось сохранить токен клиента %s в кэш", client_id, exc_info=True)
+        return _token_response(entry, now)
+
+    async def create_client(self, name: str, scopes: list[str]) -> tuple[ServiceClient, str]:
+        """Зарегистрировать клиента; секрет возвращается один раз, в базе хранится только его хэш"""
+        client_id, client_secret = generate_client_credentials()
+        client = ServiceClient(
+            client_id=client_id, secret=client_secret, name=name, scopes=normalize_scope(" ".join(scopes))
+        )
+        self.db.add(client)
+        await self.db.commit()
+        return client, client_secret
+
+    async def list_clients(self) -> list[ServiceClient]:
+        result = await self.db.execute(select(ServiceClient).order_by(ServiceClient.created_at))
+        return list(result.scalars())
+
+    async def rotate_secret(self, redis: Redis, client_id: str) -> Optional[str]:
+        """Новый секрет; уже выданные токены действуют до истечения, но из кэша больше не отдаются"""
+        client = await self._get_client(client_id)
+        if client is None:
+            return None
+        client_secret = secrets.token_urlsafe(32)
+        client.set_secret(client_secret)
+        await self.db.commit()
+        await self._purge_cache(redis, client_id)
+        return client_secret
+
+    async def disable_client(self, redis: Redis, settings: Settings, client_id: str) -> bool:
+        """Выключить клиента и отозвать его токены (отзыв по sub действует на весь срок жизни токена)"""
+        client = await self._get_client(client_id)
+        if client is None:
+            return False
+        client.is_active = False
+        await self.db.commit()
+        await self._purge_cache(redis, client_id)
+        await get_revocation_checker().revoke_user(redis, client_id, settings.client_token_ttl_seconds)
+        return True
+
+    async def _get_client(self, client_id: str) -> Optional[ServiceClient]:
+        result = await self.db.execute(select(ServiceClient).where(ServiceClient.client_id == client_id))
+        return result.scalar_one_or_none()
+
+    async def _purge_cache(self, redis: Redis, client_id: str) -> None:
+        keys = [key async for key in redis.scan_iter(match=CLIENT_TOKEN_PREFIX + client_id + ":*", count=100)]
+        if keys:
+            await redis.delete(*keys)
+
+
+def _token_response(entry: dict, now: int) -> dict:
+    """Ответ по RFC 6749 §5.1"""
+    return {
+        "access_token": entry["token"],
+        "token_type": "Bearer",
+        "expires_in": entry["exp"] - now,
+        "scope": entry["scope"],
+    }
+
+
+def get_client_credentials_service(db: AsyncSession = Depends(get_session)) -> ClientCredentialsService:
+    return ClientCredentialsService(db)
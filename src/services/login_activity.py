@@ -0,0 +1,123 @@
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi import Depends
+from sqlalchemy import Date, cast, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.db.postgres import get_session
+from src.models.user import LoginActivityDaily, LoginActivityDailyTotal, LoginHistory, RollupWatermark
+
+ROLLUP_NAME = "login_activity"
+
+# Начало самой старой пишущей транзакции (с выданным xid), кроме текущей. Чужие сессии видны
+# владельцу роли или с pg_read_all_stats — job должен работать под той же ролью, что и приложение
+OLDEST_WRITE_XACT = text(
+    "SELECT min(xact_start) FROM pg_stat_activity WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid()"
+)
+
+
+class LoginActivityService:
+    """Агрегаты входов читаются из rollup-таблиц: O(дней), а не O(входов)"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_user_activity(self, user_id: str, date_from: date, date_to: date) -> list[LoginActivityDaily]:
+        """Входы пользователя по дням, типам устройств и статусам"""
+        query = (
+            select(LoginActivityDaily)
+            .where(LoginActivityDaily.user_id == user_id, LoginActivityDaily.day.between(date_from, date_to))
+            .order_by(LoginActivityDaily.day)
+        )
+        result = await self.db.execute(query)
+        return list(result.scalars())
+
+    async def get_total_activity(self, date_from: date, date_to: date) -> list[LoginActivityDailyTotal]:
+        """Входы всех пользователей по дням, типам устройств и статусам"""
+        query = (
+            select(LoginActivityDailyTotal)
+            .where(LoginActivityDailyTotal.day.between(date_from, date_to))
+            .order_by(LoginActivityDailyTotal.day)
+        )
+        result = await self.db.execute(query)
+        return list(result.scalars())
+
+
+def get_login_activity_service(db: AsyncSession = Depends(get_session)) -> LoginActivityService:
+    result = LoginActivityService(db)
+    return result
+
+
+def refresh_login_activity_rollup(db: Session, lag: timedelta, window: timedelta) -> int:
+    """
+    Дописывает в rollup-таблицы записи login_history из интервала (watermark, now - lag].
+
+    Watermark проходит только то, что уже не может появиться: login_time ставится при INSERT внутри
+    транзакции, поэтому незакоммиченный вход не старше начала своей пишущей транзакции. Граница —
+    min(now, начало самой старой пишущей транзакции) - lag, так что долгая транзакция задерживает
+    watermark, а не теряет вход. lag покрывает расхождение часов приложения и базы; вход, чей login_time
+    отстаёт от начала его транзакции больше чем на lag, не будет учтён.
+    Интервал обрабатывается окнами window, каждое окно — отдельная короткая транзакция, которая
+    сдвигает watermark. Строка watermark блокируется на время окна, поэтому параллельные запуски
+    не посчитают одни и те же входы дважды. Возвращает количество учтённых записей истории.
+    """
+    upper_bound = datetime.utcnow() - lag
+    oldest_write = db.scalar(OLDEST_WRITE_XACT)
+    if oldest_write is not None:
+        upper_bound = min(upper_bound, oldest_write.astimezone(timezone.utc).replace(tzinfo=None) - lag)
+
+    first_login = db.scalar(select(func.min(LoginHistory.login_time)))
+    initial = first_login - timedelta(microseconds=1) if first_login else upper_bound
+    db.execute(insert(RollupWatermark).values(name=ROLLUP_NAME, value=initial).on_conflict_do_nothing())
+    db.commit()
+
+    processed = 0
+    while True:
+        watermark = db.execute(
+            select(RollupWatermark).where(RollupWatermark.name == ROLLUP_NAME).with_for_update()
+        ).scalar_one()
+        if watermark.value >= upper_bound:
+            db.rollback()
+            return processed
+
+        window_end = min(watermark.value + window, upper_bound)
+        processed += _rollup_window(db, watermark.value, window_end)
+        watermark.value = window_end
+        db.commit()
+
+
+def _rollup_window(db: Session, start: datetime, end: datetime) -> int:
+    """Агрегирует входы из интервала (start, end] и прибавляет их к счётчикам"""
+    day = cast(LoginHistory.login_time, Date)
+    device_type = func.coalesce(LoginHistory.device_type, "unknown")
+    in_window = (LoginHistory.login_time > start, LoginHistory.login_time <= end)
+
+    per_user = (
+        select(LoginHistory.user_id, day, device_type, LoginHistory.login_status, func.count())
+        .where(*in_window)
+        .group_by(LoginHistory.user_id, day, device_type, LoginHistory.login_status)
+    )
+    stmt = insert(LoginActivityDaily).from_select(["user_id", "day", "device_type", "login_status", "count"], per_user)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id", "day", "device_type", "login_status"],
+            set_={"count": LoginActivityDaily.count + stmt.excluded.count},
+        )
+    )
+
+    total = (
+        select(day, device_type, LoginHistory.login_status, func.count())
+        .where(*in_window)
+        .group_by(day, device_type, LoginHistory.login_status)
+    )
+    stmt = insert(LoginActivityDailyTotal).from_select(["day", "device_type", "login_status", "count"], total)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["day", "device_type", "login_status"],
+            set_={"count": LoginActivityDailyTotal.count + stmt.excluded.count},
+        )
+    )
+
+    return db.scalar(select(func.count()).select_from(LoginHistory).where(*in_window))
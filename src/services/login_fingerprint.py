@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import time
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.core.config import Settings
+from src.services.user_agent import get_user_agent_classifier
+
+logger = logging.getLogger(__name__)
+
+# login_fp:<user_id> — sorted set недавних отпечатков, score — время последнего входа (для вытеснения LRU)
+FINGERPRINT_PREFIX = "login_fp:"
+
+NEW_DEVICE = "new_device"
+NEW_NETWORK = "new_network"
+
+
+def network_of(ip_address: str) -> str:
+    """Сеть /24 для IPv4 и /48 для IPv6: смена адреса внутри сети провайдера не считается новым местом"""
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return "unknown"
+    prefix = 24 if address.version == 4 else 48
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def _digest(value: str) -> str:
+    # В Redis попадает только короткий хэш, а не адрес и User-Agent
+    return hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+
+
+def login_fingerprints(user_agent: str, device_type: str, ip_address: str) -> tuple[str, str]:
+    """Отпечатки устройства и сети: члены sorted set пользователя"""
+    device = "d:" + _digest(f"{get_user_agent_classifier().family(user_agent)}|{device_type}")
+    network = "n:" + _digest(network_of(ip_address))
+    return device, network
+
+
+async def check_login_fingerprint(
+    redis: Redis, settings: Settings, user_id: str, user_agent: str, device_type: str, ip_address: str
+) -> list[str]:
+    """
+    Сравнить вход с недавними отпечатками пользователя и запомнить его: один pipeline, один round trip.
+
+    Возвращает причины подозрительности (NEW_DEVICE, NEW_NETWORK). Первый вход пользователя без истории
+    отпечатков подозрительным не считается. Если Redis недоступен или не ответил за
+    login_fingerprint_timeout_seconds, вход не помечается: проверка не должна задерживать /auth.
+    """
+    device, network = login_fingerprints(user_agent, device_type, ip_address)
+    key = FINGERPRINT_PREFIX + user_id
+    try:
+        known, (device_seen, network_seen), *_ = await asyncio.wait_for(
+            _record_fingerprint(redis, settings, key, device, network), settings.login_fingerprint_timeout_seconds
+        )
+    except TimeoutError:
+        logger.warning("Проверка отпечатка входа пользователя %s не уложилась во время", user_id)
+        return []
+    except (RedisError, OSError):
+        logger.warning("Не удалось проверить отпечаток входа пользователя %s", user_id, exc_info=True)
+        return []
+
+    if not known:
+        return []
+    reasons = []
+    if device_seen is None:
+        reasons.append(NEW_DEVICE)
+    if network_seen is None:
+        reasons.append(NEW_NETWORK)
+    return reasons
+
+
+async def _record_fingerprint(redis: Redis, settings: Settings, key: str, device: str, network: str) -> list:
+    async with redis.pipeline(transaction=False) as pipe:
+        # Команды выполняются по порядку: ZMSCORE видит набор до добавления текущего входа
+        pipe.zcard(key)
+        pipe.zmscore(key, [device, network])
+        now = time.time()
+        pipe.zadd(key, {device: now, network: now})
+        # Самые давно не встречавшиеся отпечатки вытесняются сверх лимита
+        pipe.zremrangebyrank(key, 0, -settings.login_fingerprint_max_entries - 1)
+        pipe.expire(key, settings.login_fingerprint_ttl_days * 24 * 3600)
+        return await pipe.execute()
+
+
+def flagged_login_status(reasons: list[str]) -> str:
+    """Статус входа для login_history: success, new_device, new_network или new_device_network"""
+    if not reasons:
+        return "success"
+    if len(reasons) == 2:
+        return "new_device_network"
+    return reasons[0]
@@ -1,19 +1,69 @@
+import csv
+import io
+import zlib
+from typing import AsyncIterator, Sequence
 from uuid import UUID
 
-import dotenv
-import user_agents
+import orjson
 from async_fastapi_jwt_auth import AuthJWT
 from fastapi import Depends, Request
 from redis.asyncio import Redis
-from sqlalchemy import select
+from sqlalchemy import Row, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.config import get_settings
+from src.core.metrics import count_login
+from src.db import redis_db
 from src.db.postgres import get_session
+from src.db.queries import login_history_stmt
+from src.db.replicas import execute_read, read_session
 from src.models.user import LoginHistory
 from src.schemas.login_history import LoginHistoryCreateSchema, LoginHistoryResponseSchema
+from src.services.login_fingerprint import check_login_fingerprint, flagged_login_status
+from src.services.outbox import SUSPICIOUS_LOGIN, USER_LOGGED_IN, add_outbox_event
 from src.services.token import TokenService
+from src.services.user_agent import get_user_agent_classifier
 
-dotenv.load_dotenv()
+EXPORT_COLUMNS = (
+    LoginHistory.id,
+    LoginHistory.login_time,
+    LoginHistory.ip_address,
+    LoginHistory.user_agent,
+    LoginHistory.device_type,
+    LoginHistory.login_status,
+)
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+# Сжатие идёт в event loop: уровень ниже дефолтного почти не проигрывает в размере, но заметно быстрее
+EXPORT_GZIP_LEVEL = 5
+
+
+def _encode_ndjson(rows: Sequence[Row]) -> bytes:
+    return b"".join(orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+
+def _encode_csv(rows: Sequence[Row]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        (row.id, row.login_time.isoformat(), row.ip_address, row.user_agent, row.device_type, row.login_status)
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _prepend(first: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in chunks:
+        yield chunk
 
 
 class LoginHistoryService:
@@ -38,6 +88,15 @@ class LoginHistoryService:
         # Определяем тип устройства из User-Agent
         device_type = await self.parse_device_type(user_agent_header)
 
+        # Успешный вход с нового устройства или из новой сети помечается в статусе
+        reasons = []
+        settings = get_settings()
+        if login_status == "success" and settings.login_fingerprint_enabled and redis_db.redis is not None:
+            reasons = await check_login_fingerprint(
+                redis_db.redis, settings, str(user_id), user_agent_header, device_type, ip_address
+            )
+            login_status = flagged_login_status(reasons)
+
         # Создаем схему с извлеченными данными
         history_data = LoginHistoryCreateSchema(
             user_id=user_id,
@@ -50,8 +109,31 @@ class LoginHistoryService:
         # Создаем и сохраняем запись в БД
         history_db = LoginHistory(**history_data.model_dump())
         self.db.add(history_db)
+        add_outbox_event(
+            self.db,
+            USER_LOGGED_IN,
+            {
+                "user_id": str(user_id),
+                "ip_address": ip_address,
+                "device_type": device_type,
+                "login_status": login_status,
+            },
+        )
+        if reasons:
+            add_outbox_event(
+                self.db,
+                SUSPICIOUS_LOGIN,
+                {
+                    "user_id": str(user_id),
+                    "reasons": reasons,
+                    "ip_address": ip_address,
+                    "device_type": device_type,
+                    "user_agent": user_agent_header,
+                },
+            )
         await self.db.commit()
         await self.db.refresh(history_db)
+        count_login(login_status)
 
         return LoginHistoryResponseSchema.model_validate(history_db)
 
@@ -74,36 +156,49 @@ class LoginHistoryService:
         """
         Определяет тип устройства из User-Agent строки
         """
-        if not user_agent:
-            return "unknown"
-
-        try:
-            ua = user_agents.parse(user_agent)
-
-            if ua.is_mobile:
-                return "mobile"
-            elif ua.is_tablet:
-                return "tablet"
-            elif ua.is_pc:
-                return "desktop"
-            elif ua.is_bot:
-                return "bot"
-            else:
-                return "other"
-        except:
-            return "unknown"
+        return get_user_agent_classifier().classify(user_agent)
 
     async def get_login_history(self, user_id: str, token_service: TokenService, authorize: AuthJWT, redis: Redis):
         """Получение истории входа пользователя"""
         await token_service.get_token_from_redis(authorize, redis)
 
-        query = select(LoginHistory).where(LoginHistory.user_id == user_id)
-        result = await self.db.execute(query)
-        history = result.scalars().all()
+        # Строки Core без гидратации ORM: схема ответа читает поля по атрибутам
+        result = await execute_read(self.db, login_history_stmt(user_id))
+        history = result.all()
 
         if history:
             return list(history)
 
+    async def export_login_history(
+        self, user_id: str, export_format: str, compress: bool, batch_size: int
+    ) -> AsyncIterator[bytes]:
+        """
+        Выгрузка всей истории входов в NDJSON или CSV частями по batch_size строк.
+
+        Строки читаются серверным курсором (stream + yield_per), поэтому память не зависит от размера истории.
+        Запрос выполняется до возврата итератора: ошибка БД станет ответом 5xx, а не оборванным ответом 200.
+        """
+        chunks = self._export_chunks(user_id, export_format, batch_size)
+        if compress:
+            chunks = _gzip(chunks)
+        first = await anext(chunks, b"")
+        return _prepend(first, chunks)
+
+    async def _export_chunks(self, user_id: str, export_format: str, batch_size: int) -> AsyncIterator[bytes]:
+        query = (
+            select(*EXPORT_COLUMNS)
+            .where(LoginHistory.user_id == user_id)
+            .order_by(LoginHistory.login_time)
+            .execution_options(yield_per=batch_size)
+        )
+        encode = _encode_csv if export_format == "csv" else _encode_ndjson
+        async with read_session(self.db, query) as session:
+            result = await session.stream(query)
+            if export_format == "csv":
+                yield (",".join(column.name for column in EXPORT_COLUMNS) + "\r\n").encode()
+            async for rows in result.partitions():
+                yield encode(rows)
+
 
 def get_login_history(db: AsyncSession = Depends(get_session)) -> LoginHistoryService:
     result = LoginHistoryService(db)
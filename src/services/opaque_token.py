@@ -0,0 +1,35 @@
+import secrets
+import time
+
+from redis.asyncio import Redis
+
+# Данные сессии opaque-токена: хэш session:<token> с TTL, равным сроку жизни токена
+SESSION_PREFIX = "session:"
+
+
+async def issue_opaque_token(redis: Redis, claims: dict, expires_time: int) -> str:
+    """Выпустить короткий случайный токен и сохранить claims в Redis (одна транзакция)"""
+    token = secrets.token_urlsafe(24)
+    key = SESSION_PREFIX + token
+    mapping = {name: str(value) for name, value in claims.items()}
+    now = int(time.time())
+    mapping["jti"] = token
+    mapping["iat"] = str(now)
+    mapping["exp"] = str(now + expires_time)
+
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, expires_time)
+        await pipe.execute()
+    return token
+
+
+async def resolve_opaque_token(redis: Redis, token: str) -> dict | None:
+    """Claims токена одним HGETALL; None — токена нет, он истёк или отозван"""
+    claims = await redis.hgetall(SESSION_PREFIX + token)
+    return claims or None
+
+
+async def revoke_opaque_token(redis: Redis, token: str) -> None:
+    """Отзыв — просто удаление сессии"""
+    await redis.delete(SESSION_PREFIX + token)
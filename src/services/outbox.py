@@ -0,0 +1,136 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+import orjson
+from redis import Redis
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.core.config import Settings
+from src.models.user import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+USER_CREATED = "user.created"
+USER_LOGGED_IN = "user.logged_in"
+USER_LOGGED_OUT = "user.logged_out"
+SUSPICIOUS_LOGIN = "user.suspicious_login"
+USER_DELETED = "user.deleted"
+ROLE_CREATED = "role.created"
+
+# Предел паузы relay после ошибок Redis или базы подряд, секунды
+RELAY_MAX_BACKOFF_SECONDS = 60.0
+
+
+def add_outbox_event(db: AsyncSession | Session, event_type: str, payload: dict) -> None:
+    """Добавить событие в outbox: оно будет закоммичено вместе с остальными изменениями сессии"""
+    db.add(OutboxEvent(event_type=event_type, payload=payload))
+
+
+def ensure_consumer_groups(redis: Redis, settings: Settings) -> None:
+    """Создать stream и группы потребителей, если их ещё нет"""
+    for group in settings.outbox_consumer_group_list:
+        try:
+            redis.xgroup_create(settings.outbox_stream, group, id="0", mkstream=True)
+        except ResponseError as error:
+            if "BUSYGROUP" not in str(error):
+                raise
+
+
+def relay_outbox_batch(db: Session, redis: Redis, settings: Settings) -> int:
+    """
+    Опубликовать пачку неопубликованных событий в Redis Stream.
+
+    Доставка at-least-once: событие помечается опубликованным только после XADD,
+    поэтому при падении между XADD и коммитом пачка будет отправлена повторно —
+    потребители должны быть идемпотентны по полю id. Длина stream ограничена MAXLEN ~.
+    """
+    events = (
+        db.execute(
+            select(OutboxEvent)
+            .where(OutboxEvent.published_at.is_(None))
+            .order_by(OutboxEvent.id)
+            .limit(settings.outbox_batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        .scalars()
+        .all()
+    )
+    if not events:
+        db.rollback()
+        return 0
+
+    pipe = redis.pipeline(transaction=False)
+    for event in events:
+        pipe.xadd(
+            settings.outbox_stream,
+            {
+                "id": event.id,
+                "type": event.event_type,
+                "payload": orjson.dumps(event.payload),
+                "created_at": event.created_at.isoformat(),
+            },
+            maxlen=settings.outbox_stream_maxlen,
+            approximate=True,
+        )
+    pipe.execute()
+
+    db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_([event.id for event in events]))
+        .values(published_at=datetime.utcnow())
+    )
+    db.commit()
+    return len(events)
+
+
+def purge_published_events(db: Session, settings: Settings) -> int:
+    """Удалить опубликованные события старше срока хранения"""
+    border = datetime.utcnow() - timedelta(hours=settings.outbox_retention_hours)
+    result = db.execute(delete(OutboxEvent).where(OutboxEvent.published_at < border))
+    db.commit()
+    return result.rowcount
+
+
+def run_outbox_relay(db: Session, redis: Redis, settings: Settings, once: bool = False) -> None:
+    """
+    Цикл relay: публикует события, пока они есть, и ждёт новых poll_interval секунд.
+
+    Ошибка Redis или базы не останавливает процесс: транзакция откатывается (события остаются
+    неопубликованными), а пауза перед повтором растёт вдвое до RELAY_MAX_BACKOFF_SECONDS.
+    """
+    groups_ready = False
+    failures = 0
+    last_purge = 0.0
+    while True:
+        try:
+            if not groups_ready:
+                ensure_consumer_groups(redis, settings)
+                groups_ready = True
+
+            published = relay_outbox_batch(db, redis, settings)
+            if published:
+                logger.info("Опубликовано событий: %s", published)
+
+            if time.monotonic() - last_purge > 3600:
+                purge_published_events(db, settings)
+                last_purge = time.monotonic()
+        except (RedisError, OSError, SQLAlchemyError):
+            if once:
+                raise
+            db.rollback()
+            failures += 1
+            delay = min(settings.outbox_poll_interval_seconds * 2**failures, RELAY_MAX_BACKOFF_SECONDS)
+            logger.exception("Ошибка relay outbox (подряд: %s), повтор через %.1f с", failures, delay)
+            time.sleep(delay)
+            continue
+        failures = 0
+
+        if once and not published:
+            return
+        if not published:
+            time.sleep(settings.outbox_poll_interval_seconds)
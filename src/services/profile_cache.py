@@ -0,0 +1,115 @@
+import logging
+from typing import Awaitable, Callable, Iterable, Optional
+
+import orjson
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import get_settings
+from src.core.metrics import PROFILE_CACHE_COALESCED, PROFILE_CACHE_ERROR, PROFILE_CACHE_HIT, PROFILE_CACHE_MISS
+from src.db.queries import user_profile_stmt
+from src.db.replicas import execute_read
+from src.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PREFIX = "user_profile:"
+# После инвалидации ключ на короткое время занимает пустой маркер: загрузка, начатая до коммита,
+# не сможет положить в кэш устаревший профиль (запись идёт через SET NX)
+TOMBSTONE = b""
+TOMBSTONE_TTL = 5
+
+
+def queue_profile_invalidation(pipe: Pipeline, user_ids: Iterable) -> None:
+    """Добавить в pipeline сброс профилей, чтобы объединить его с другими командами"""
+    for user_id in user_ids:
+        pipe.set(PROFILE_PREFIX + str(user_id), TOMBSTONE, ex=TOMBSTONE_TTL)
+
+
+class UserProfileCache:
+    """
+    Read-through кэш профилей пользователей в Redis (orjson, TTL).
+
+    Одновременные промахи по одному пользователю в пределах воркера объединяются:
+    в базу идёт один запрос, остальные ждут его результата (single-flight).
+    Попадания и промахи видны в auth_profile_cache_requests_total, stats() — счётчики этого экземпляра.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._flights = SingleFlight(on_coalesced=PROFILE_CACHE_COALESCED.inc)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, redis: Redis, user_id: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        key = PROFILE_PREFIX + user_id
+        try:
+            cached = await redis.get(key)
+        except (RedisError, OSError):
+            logger.warning("Кэш профилей недоступен, читаем из базы", exc_info=True)
+            PROFILE_CACHE_ERROR.inc()
+            return await loader()
+
+        if cached:
+            self.hits += 1
+            PROFILE_CACHE_HIT.inc()
+            return orjson.loads(cached)
+        self.misses += 1
+        PROFILE_CACHE_MISS.inc()
+
+        return await self._flights.run(user_id, lambda: self._load(redis, key, loader))
+
+    async def _load(self, redis: Redis, key: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        profile = await loader()
+        if profile is not None:
+            try:
+                await redis.set(key, orjson.dumps(profile), ex=self.ttl, nx=True)
+            except (RedisError, OSError):
+                logger.warning("Не удалось записать профиль в кэш", exc_info=True)
+        return profile
+
+    async def invalidate(self, redis: Redis, *user_ids: str) -> None:
+        """Сбросить профили после изменения пользователей или их ролей (одним pipeline)"""
+        if not user_ids:
+            return
+        async with redis.pipeline(transaction=False) as pipe:
+            queue_profile_invalidation(pipe, user_ids)
+            await pipe.execute()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self._flights.coalesced,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+profile_cache: Optional[UserProfileCache] = None
+
+
+def get_profile_cache() -> UserProfileCache:
+    global profile_cache
+    if profile_cache is None:
+        profile_cache = UserProfileCache(ttl=get_settings().user_profile_cache_ttl_seconds)
+    return profile_cache
+
+
+async def load_user_profile(db: AsyncSession, user_id: str) -> Optional[dict]:
+    # Профиль нужен для выпуска токена: пользователя, которого ещё нет на реплике, ищем на primary
+    result = await execute_read(db, user_profile_stmt(user_id), primary_on_empty=True)
+    row = result.mappings().one_or_none()
+    if row is None:
+        return None
+    profile = dict(row)
+    profile["id"] = str(profile["id"])
+    profile["role_id"] = str(profile["role_id"])
+    profile["created_at"] = profile["created_at"].isoformat() if profile["created_at"] else None
+    return profile
+
+
+async def get_user_profile(db: AsyncSession, redis: Redis, user_id: str) -> Optional[dict]:
+    return await get_profile_cache().get(redis, user_id, lambda: load_user_profile(db, user_id))
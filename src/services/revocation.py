@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.core.circuit_breaker import CircuitBreaker
+from src.core.config import Settings, get_settings
+from src.core.metrics import (
+    REVOCATION_FAIL_CLOSED,
+    REVOCATION_FAIL_OPEN,
+    REVOCATION_REVOKED,
+    REVOCATION_SNAPSHOT_REVOKED,
+    REVOCATION_SNAPSHOT_VALID,
+    REVOCATION_VALID,
+)
+
+logger = logging.getLogger(__name__)
+
+# Все отозванные jti лежат под этим префиксом, чтобы снимок строился SCAN-ом только по ним
+BLACKLIST_PREFIX = "blacklist:"
+# Отзыв всех токенов пользователя (удаление аккаунта): blacklist:user:<user_id> попадает и в снимок
+USER_MARKER = "user:"
+
+
+class BloomFilter:
+    """Компактное множество jti: ложноположительные ответы возможны, ложноотрицательные — нет"""
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationChecker:
+    """
+    Проверка отзыва токенов через Redis за circuit breaker с жёстким таймаутом.
+
+    Пока breaker разомкнут, ответ даёт локальный снимок отозванных jti (фильтр Блума),
+    который периодически перестраивается. Если снимка нет или он устарел, поведение
+    определяется политикой маршрута: fail-open пропускает запрос, fail-closed отвечает 503.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.revocation_breaker_failures,
+            reset_timeout=settings.revocation_breaker_reset_seconds,
+        )
+        self.snapshot: Optional[BloomFilter] = None
+        self.snapshot_built_at = 0.0
+
+    @property
+    def snapshot_is_fresh(self) -> bool:
+        return (
+            self.snapshot is not None
+            and time.monotonic() - self.snapshot_built_at <= self.settings.revocation_snapshot_max_age_seconds
+        )
+
+    async def is_revoked(self, redis: Redis, jti: str, fail_open: bool, user_id: Optional[str] = None) -> bool:
+        # Ключ без префикса — блэклист в старом формате, пока не истекли выданные ранее токены
+        keys = [BLACKLIST_PREFIX + jti, jti]
+        if user_id:
+            keys.append(BLACKLIST_PREFIX + USER_MARKER + user_id)
+        if self.breaker.allow_request():
+            try:
+                found = await asyncio.wait_for(redis.exists(*keys), self.settings.revocation_redis_timeout)
+            except (RedisError, OSError, asyncio.TimeoutError):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+                (REVOCATION_REVOKED if found else REVOCATION_VALID).inc()
+                return bool(found)
+
+        if self.snapshot_is_fresh:
+            revoked = jti in self.snapshot or bool(user_id) and USER_MARKER + user_id in self.snapshot
+            (REVOCATION_SNAPSHOT_REVOKED if revoked else REVOCATION_SNAPSHOT_VALID).inc()
+            return revoked
+        if fail_open:
+            REVOCATION_FAIL_OPEN.inc()
+            return False
+        REVOCATION_FAIL_CLOSED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Проверка токена временно недоступна"
+        )
+
+    async def revoke(self, redis: Redis, jti: str, ttl_seconds: int, user_id: str) -> None:
+        await self._revoke(redis, jti, ttl_seconds, user_id)
+
+    async def revoke_user(self, redis: Redis, user_id: str, ttl_seconds: int) -> None:
+        """Отозвать все токены пользователя, выпущенные за ttl_seconds (не меньше срока жизни refresh-токена)"""
+        await self._revoke(redis, USER_MARKER + user_id, ttl_seconds, user_id)
+
+    async def _revoke(self, redis: Redis, item: str, ttl_seconds: int, user_id: str) -> None:
+        if self.snapshot is not None:
+            self.snapshot.add(item)
+        try:
+            await asyncio.wait_for(
+                redis.setex(BLACKLIST_PREFIX + item, ttl_seconds, user_id), self.settings.revocation_redis_timeout
+            )
+        except (RedisError, OSError, asyncio.TimeoutError):
+            self.breaker.record_failure()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Не удалось отозвать токен, повторите позже"
+            )
+        self.breaker.record_success()
+
+    async def refresh_snapshot(self, redis: Redis) -> None:
+        """Перестроить снимок по ключам блэклиста (SCAN только по префиксу)"""
+        jtis = [
+            key.removeprefix(BLACKLIST_PREFIX)
+            async for key in redis.scan_iter(match=BLACKLIST_PREFIX + "*", count=1000)
+        ]
+        # Запас ёмкости под jti, которые этот воркер отзовёт до следующего обновления
+        snapshot = BloomFilter(
+            capacity=max(len(jtis) * 2, 1024),
+            false_positive_rate=self.settings.revocation_snapshot_false_positive_rate,
+        )
+        for jti in jtis:
+            snapshot.add(jti)
+        self.snapshot = snapshot
+        self.snapshot_built_at = time.monotonic()
+
+    async def refresh_snapshot_periodically(self, redis: Redis) -> None:
+        while True:
+            if not self.breaker.is_open:
+                try:
+                    await self.refresh_snapshot(redis)
+                except (RedisError, OSError, asyncio.TimeoutError):
+                    logger.warning("Не удалось обновить снимок отозванных токенов", exc_info=True)
+            await asyncio.sleep(self.settings.revocation_snapshot_interval_seconds)
+
+
+revocation_checker: Optional[RevocationChecker] = None
+
+
+def get_revocation_checker() -> RevocationChecker:
+    global revocation_checker
+    if revocation_checker is None:
+        revocation_checker = RevocationChecker(get_settings())
+    return revocation_checker
+
+
+def revocation_fail_open(request: Request) -> bool:
+    """Политика маршрута при недоступном Redis и без свежего снимка: True — пропускать, False — 503"""
+    settings = get_settings()
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    if path in settings.revocation_fail_open_route_list:
+        return True
+    if path in settings.revocation_fail_closed_route_list:
+        return False
+    return settings.revocation_fail_open
@@ -0,0 +1,150 @@
+import logging
+import time
+import uuid
+from typing import Callable, Iterable, Iterator, Optional
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import UUID, any_, bindparam, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from exceptions import RoleNotFound
+from src.db.postgres import get_session
+from src.models.user import Role, User
+from src.services.profile_cache import queue_profile_invalidation
+from src.services.token import ACCESS_TOKEN_EXPIRES
+from src.services.user_search import user_filter
+
+logger = logging.getLogger(__name__)
+
+# role_changed:<user_id> — время смены роли в миллисекундах; access-токены, выпущенные не позже, несут старую роль
+ROLE_CHANGED_PREFIX = "role_changed:"
+# Отметки меньше этого значения записаны в секундах (10**11 мс — 1973 год, 10**11 с — далёкое будущее)
+SECONDS_MARK_LIMIT = 10**11
+
+# Один параметр-массив вместо IN (...): текст запроса одинаков для всех пачек и подготавливается один раз
+_ids_param = bindparam("ids", type_=ARRAY(UUID(as_uuid=True)))
+
+Progress = Callable[[dict], None]
+
+
+def role_changed_mark() -> int:
+    """Значение отметки role_changed: текущее время в миллисекундах, как iat_ms в токене"""
+    return time.time_ns() // 1_000_000
+
+
+async def role_changed_since(redis: Redis, claims: dict) -> bool:
+    """
+    Роль пользователя менялась после выпуска токена — роли из claims доверять нельзя.
+
+    Сравнение по iat_ms: токен, выпущенный в ту же секунду уже после смены роли, остаётся действительным.
+    Для токенов без iat_ms берётся начало секунды iat — такой токен, выпущенный в секунду смены роли, отклоняется.
+    """
+    changed_at = await redis.get(ROLE_CHANGED_PREFIX + str(claims.get("sub")))
+    if changed_at is None:
+        return False
+    changed_at = int(changed_at)
+    if changed_at < SECONDS_MARK_LIMIT:
+        # Отметка, поставленная до перехода на миллисекунды, — в секундах
+        changed_at = changed_at * 1000 + 999
+    issued_at = claims.get("iat_ms") or int(claims.get("iat") or 0) * 1000
+    return int(issued_at) <= changed_at
+
+
+def _chunks(user_ids: Iterable, size: int) -> Iterator[list[uuid.UUID]]:
+    chunk = []
+    for user_id in user_ids:
+        chunk.append(user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id)))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class RoleAssignmentService:
+    """
+    Массовая смена роли: пачки по chunk_size, каждая — один UPDATE ... WHERE id = ANY(:ids) в своей транзакции.
+
+    После коммита пачки одним pipeline сбрасываются профили в кэше (из них берётся роль для новых токенов)
+    и ставится отметка role_changed для уже выданных access-токенов.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def reassign(
+        self,
+        redis: Redis,
+        role_name: str,
+        chunk_size: int,
+        user_ids: Optional[list] = None,
+        query: Optional[str] = None,
+        from_role: Optional[str] = None,
+        progress: Optional[Progress] = None,
+    ) -> dict:
+        result = await self.db.execute(select(Role).filter(Role.name == role_name))
+        role = result.scalar_one_or_none()
+        if role is None:
+            raise RoleNotFound
+
+        report = {"role": role_name, "matched": 0, "updated": 0, "chunks": 0, "not_invalidated": 0}
+        chunks = _chunks(user_ids, chunk_size) if user_ids is not None else None
+        last_id = None
+        while True:
+            if chunks is not None:
+                chunk = next(chunks, None)
+            else:
+                chunk = await self._next_filtered_chunk(query, from_role, last_id, chunk_size)
+            if not chunk:
+                return report
+            last_id = chunk[-1]
+
+            result = await self.db.execute(
+                update(User)
+                .where(User.id == any_(_ids_param), User.role_id != role.id)
+                .values(role_id=role.id)
+                .returning(User.id)
+                .execution_options(synchronize_session=False),
+                {"ids": chunk},
+            )
+            changed = result.scalars().all()
+            await self.db.commit()
+            if changed:
+                try:
+                    await self._invalidate(redis, changed)
+                except (RedisError, OSError):
+                    # Роли уже закоммичены: профили истекут по TTL, а пользователей стоит попросить перелогиниться
+                    logger.warning("Не удалось сбросить кэш ролей для %s пользователей", len(changed), exc_info=True)
+                    report["not_invalidated"] += len(changed)
+
+            report["matched"] += len(chunk)
+            report["updated"] += len(changed)
+            report["chunks"] += 1
+            logger.info("Смена роли на %s: пачка %s, изменено %s", role_name, report["chunks"], report["updated"])
+            if progress is not None:
+                progress(report)
+
+    async def _invalidate(self, redis: Redis, user_ids: list[uuid.UUID]) -> None:
+        changed_at = role_changed_mark()
+        async with redis.pipeline(transaction=False) as pipe:
+            queue_profile_invalidation(pipe, user_ids)
+            for user_id in user_ids:
+                pipe.set(ROLE_CHANGED_PREFIX + str(user_id), changed_at, ex=ACCESS_TOKEN_EXPIRES)
+            await pipe.execute()
+
+    async def _next_filtered_chunk(
+        self, query: Optional[str], from_role: Optional[str], last_id: Optional[uuid.UUID], size: int
+    ) -> list[uuid.UUID]:
+        # Keyset по id и чтение с primary: реплика может не увидеть предыдущие пачки
+        stmt = user_filter([User.id], query, from_role).order_by(User.id).limit(size)
+        if last_id is not None:
+            stmt = stmt.where(User.id > last_id)
+        result = await self.db.execute(stmt)
+        return list(result.scalars())
+
+
+def get_role_assignment_service(db: AsyncSession = Depends(get_session)) -> RoleAssignmentService:
+    return RoleAssignmentService(db)
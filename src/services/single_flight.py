@@ -0,0 +1,47 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Объединение одновременных загрузок по ключу в пределах воркера.
+
+    Первый вызов (ведущий) выполняет загрузку, остальные ждут её результата или ошибки.
+    Если ведущего отменили (клиент отключился, таймаут), ожидающие не зависают: один из них
+    становится новым ведущим и загружает сам.
+    """
+
+    def __init__(self, on_coalesced: Optional[Callable[[], None]] = None):
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self.on_coalesced = on_coalesced
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> T:
+        while (in_flight := self._in_flight.get(key)) is not None:
+            self.coalesced += 1
+            if self.on_coalesced is not None:
+                self.on_coalesced()
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # Отменили ведущего, а не этот вызов — загрузку начинаем заново
+                if not in_flight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await load()
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()  # ошибку получит каждый ожидающий, здесь только снимаем предупреждение asyncio
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._in_flight[key]
+            if not future.done():
+                future.cancel()
+        return result
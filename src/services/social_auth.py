@@ -0,0 +1,170 @@
+import base64
+import hashlib
+import secrets
+from urllib.parse import urlencode
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from exceptions import OAuthProviderError, OAuthStateInvalid
+from src.core.config import get_settings
+from src.db.postgres import get_session
+from src.db.queries import fetch_role_by_name, user_exists
+from src.models.user import UNUSABLE_PASSWORD, SocialAccount, User
+from src.services.outbox import USER_CREATED, add_outbox_event
+
+OAUTH_STATE_PREFIX = "oauth_state:"
+
+YANDEX = "yandex"
+YANDEX_AUTHORIZE_URL = "https://oauth.yandex.ru/authorize"
+YANDEX_TOKEN_URL = "https://oauth.yandex.ru/token"
+YANDEX_INFO_URL = "https://login.yandex.ru/info"
+
+# Зарезервированный домен (RFC 2606) для пользователей, чей провайдер не отдал подтверждённый email
+PLACEHOLDER_EMAIL_DOMAIN = "users.invalid"
+
+
+def pkce_pair() -> tuple[str, str]:
+    """PKCE (RFC 7636): случайный verifier и его S256 challenge"""
+    verifier = secrets.token_urlsafe(64)
+    challenge = base64.urlsafe_b64encode(hashlib.sha256(verifier.encode()).digest()).rstrip(b"=").decode()
+    return verifier, challenge
+
+
+async def fetch_yandex_profile(code: str, code_verifier: str) -> dict:
+    """Обменять код на токен Яндекса и получить профиль пользователя"""
+    # aiohttp нужен только на callback провайдера: его импорт — заметная доля времени импорта приложения
+    import aiohttp
+
+    settings = get_settings()
+    token_request = {
+        "grant_type": "authorization_code",
+        "code": code,
+        "client_id": settings.yandex_client_id,
+        "client_secret": settings.yandex_client_secret,
+        "code_verifier": code_verifier,
+    }
+    try:
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=settings.oauth_http_timeout_seconds)
+        ) as session:
+            async with session.post(YANDEX_TOKEN_URL, data=token_request) as response:
+                if response.status != 200:
+                    raise OAuthProviderError
+                access_token = (await response.json())["access_token"]
+            async with session.get(
+                YANDEX_INFO_URL, params={"format": "json"}, headers={"Authorization": f"OAuth {access_token}"}
+            ) as response:
+                if response.status != 200:
+                    raise OAuthProviderError
+                return await response.json()
+    except (aiohttp.ClientError, TimeoutError, KeyError, ValueError) as exc:
+        raise OAuthProviderError from exc
+
+
+class SocialAuthService:
+    """Вход через внешних OAuth-провайдеров (сейчас Яндекс)"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def start_yandex_login(self, redis: Redis) -> str:
+        """URL формы Яндекса; state и PKCE verifier сохраняются в Redis на oauth_state_ttl_seconds"""
+        settings = get_settings()
+        state = secrets.token_urlsafe(32)
+        verifier, challenge = pkce_pair()
+        await redis.set(OAUTH_STATE_PREFIX + state, verifier, ex=settings.oauth_state_ttl_seconds)
+        params = {
+            "response_type": "code",
+            "client_id": settings.yandex_client_id,
+            "redirect_uri": settings.yandex_redirect_uri,
+            "state": state,
+            "code_challenge": challenge,
+            "code_challenge_method": "S256",
+        }
+        return f"{YANDEX_AUTHORIZE_URL}?{urlencode(params)}"
+
+    async def complete_yandex_login(self, redis: Redis, code: str, state: str) -> User:
+        """Проверить state, получить профиль и найти или привязать пользователя"""
+        # GETDEL: state одноразовый, повтор callback с тем же state не пройдёт
+        verifier = await redis.getdel(OAUTH_STATE_PREFIX + state)
+        if verifier is None:
+            raise OAuthStateInvalid
+        profile = await fetch_yandex_profile(code, verifier)
+        return await self.resolve_user(YANDEX, str(profile["id"]), profile)
+
+    async def resolve_user(self, provider: str, external_id: str, profile: dict) -> User:
+        """
+        Пользователь по аккаунту провайдера — один поиск по уникальному индексу (provider, external_id).
+
+        При первом входе аккаунт привязывается к пользователю с тем же подтверждённым email, только если у того
+        нет пароля (создан через OAuth, адрес подтверждён провайдером). Локальная регистрация email не проверяет:
+        автопривязка к учётной записи с паролем отдала бы её тому, кто зарегистрировал чужой адрес заранее
+        (или наоборот). В остальных случаях создаётся новый пользователь без пароля. Без email от провайдера
+        привязки тоже нет.
+        Хэширование пароля в этом пути не выполняется.
+        """
+        user = await self._find_linked_user(provider, external_id)
+        if user is not None:
+            return user
+
+        login = profile.get("login") or f"{provider}_{external_id}"
+        # Яндекс отдаёт в default_email только адрес, подтверждённый владельцем аккаунта
+        email = profile.get("default_email")
+        if email:
+            result = await self.db.execute(select(User).where(func.lower(User.email) == func.lower(email)))
+            user = result.scalar_one_or_none()
+            if user is not None and user.password != UNUSABLE_PASSWORD:
+                # Адрес занят локальной учётной записью: email уникален, новому пользователю — технический адрес
+                user = None
+                email = None
+        if not email:
+            email = f"{provider}_{external_id}@{PLACEHOLDER_EMAIL_DOMAIN}"
+        if user is None:
+            user = await self._create_user(provider, external_id, login, email, profile)
+        self.db.add(SocialAccount(user_id=user.id, provider=provider, external_id=external_id))
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            # Параллельный callback того же аккаунта успел привязать его первым
+            await self.db.rollback()
+            user = await self._find_linked_user(provider, external_id)
+            if user is None:
+                raise
+        return user
+
+    async def _find_linked_user(self, provider: str, external_id: str) -> User | None:
+        result = await self.db.execute(
+            select(User)
+            .join(SocialAccount)
+            .where(SocialAccount.provider == provider, SocialAccount.external_id == external_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def _create_user(self, provider: str, external_id: str, login: str, email: str, profile: dict) -> User:
+        if await user_exists(self.db, login, email):
+            login = f"{provider}_{external_id}"
+        role = await fetch_role_by_name(self.db, "user")
+        user = User(
+            login=login,
+            email=email,
+            password=None,
+            first_name=(profile.get("first_name") or "")[:50],
+            last_name=(profile.get("last_name") or "")[:50],
+            role_id=role.id,
+        )
+        self.db.add(user)
+        await self.db.flush()
+        add_outbox_event(
+            self.db,
+            USER_CREATED,
+            {"user_id": str(user.id), "login": user.login, "role": role.name, "provider": provider},
+        )
+        return user
+
+
+def get_social_auth_service(db: AsyncSession = Depends(get_session)) -> SocialAuthService:
+    return SocialAuthService(db)
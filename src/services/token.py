@@ -6,28 +6,69 @@ from async_fastapi_jwt_auth.exceptions import AuthJWTException
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from redis.asyncio import Redis
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from src.core.config import settings
+from src.core.config import get_settings
+from src.db import redis_db
 from src.db.postgres import get_session
-from src.models.user import User
+from src.services.opaque_token import issue_opaque_token, resolve_opaque_token, revoke_opaque_token
+from src.services.profile_cache import get_user_profile
+from src.services.revocation import get_revocation_checker, revocation_fail_open
+from src.services.token_issuer import get_token_issuer
+
+ACCESS_TOKEN_EXPIRES = 86400 * 7  # 7 дней
+REFRESH_TOKEN_EXPIRES = 86400 * 30  # 30 дней
+
+
+def opaque_mode() -> bool:
+    return get_settings().token_mode == "opaque"
+
+
+def raw_token(authorize: AuthJWT) -> str | None:
+    """Токен из заголовка Authorization, который AuthJWT уже разобрал"""
+    return getattr(authorize, "_token", None)
+
+
+async def get_token_claims(authorize: AuthJWT, refresh: bool = False) -> dict:
+    """Claims текущего токена: из подписи JWT или, в режиме opaque, из сессии в Redis"""
+    if not opaque_mode():
+        if refresh:
+            await authorize.jwt_refresh_token_required()
+        else:
+            await authorize.jwt_required()
+        return await authorize.get_raw_jwt()
+
+    # AuthJWT создаётся на каждый запрос: запоминаем сессию, чтобы не ходить в Redis повторно
+    claims = getattr(authorize, "_opaque_claims", None)
+    if claims is None:
+        token = raw_token(authorize)
+        claims = await resolve_opaque_token(redis_db.redis, token) if token else None
+        authorize._opaque_claims = claims
+    if not claims or claims.get("token_type") != ("refresh" if refresh else "access"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
 
 
 class TokenService:
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, fail_open: bool = False):
         self.db = db
+        # Что делать, если отзыв токена проверить нельзя (Redis недоступен и нет свежего снимка)
+        self.fail_open = fail_open
 
     async def get_current_user_required(self, authorize: AuthJWT, user_id: str) -> dict:
         """Получить пользователя (обязательная авторизация)"""
 
         try:
-            await authorize.jwt_required()
-            user_id_from_jwt = await authorize.get_jwt_subject()
+            claims = await get_token_claims(authorize)
+            user_id_from_jwt = claims.get("sub")
 
-            if user_id_from_jwt == user_id:
+            # Токен сервиса (client credentials) не действует от имени пользователя
+            if user_id_from_jwt == user_id and not claims.get("client_id"):
                 return {"user_id": user_id_from_jwt, "authenticated": True}
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, detail="У вас нет прав на доступ к данным этого пользователя"
@@ -42,18 +83,28 @@ class TokenService:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+    async def get_user_role_name(self, user_id: str) -> str:
+        """Роль пользователя для claims токена (из кэша профилей, при промахе — с реплики)"""
+
+        profile = await get_user_profile(self.db, redis_db.redis, user_id)
+        if profile is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
+        return profile["role"]
+
     async def generate_access_token(self, user_id: str, authorize: AuthJWT):
         """Генерация токена с дополнительными claims"""
 
-        stmt = select(User).options(selectinload(User.role)).where(User.id == user_id)
-        result = await self.db.execute(stmt)
-        user = result.scalar_one()
+        role_name = await self.get_user_role_name(user_id)
 
         # Дополнительные данные в токене
-        additional_claims = {"user_id": user_id, "is_active": True, "token_type": "access", "role": user.role.name}
+        additional_claims = {"user_id": user_id, "is_active": True, "token_type": "access", "role": role_name}
 
-        access_token = await authorize.create_access_token(
-            subject=user_id, user_claims=additional_claims, expires_time=86400 * 7  # 7 дней
+        if opaque_mode():
+            claims = {"sub": user_id, **additional_claims}
+            return await issue_opaque_token(redis_db.redis, claims, ACCESS_TOKEN_EXPIRES)
+
+        access_token = get_token_issuer().issue(
+            subject=user_id, token_type="access", expires_time=ACCESS_TOKEN_EXPIRES, user_claims=additional_claims
         )
 
         return access_token
@@ -61,14 +112,16 @@ class TokenService:
     async def generate_refresh_token(self, user_id: str, authorize: AuthJWT):
         """Генерация refresh токена"""
 
-        stmt = select(User).options(selectinload(User.role)).where(User.id == user_id)
-        result = await self.db.execute(stmt)
-        user = result.scalar_one()
+        role_name = await self.get_user_role_name(user_id)
+
+        additional_claims = {"user_id": user_id, "token_type": "refresh", "role": role_name}
 
-        additional_claims = {"user_id": user_id, "token_type": "refresh", "role": user.role.name}
+        if opaque_mode():
+            claims = {"sub": user_id, **additional_claims}
+            return await issue_opaque_token(redis_db.redis, claims, REFRESH_TOKEN_EXPIRES)
 
-        refresh_token = await authorize.create_refresh_token(
-            subject=user_id, user_claims=additional_claims, expires_time=86400 * 30  # 30 дней
+        refresh_token = get_token_issuer().issue(
+            subject=user_id, token_type="refresh", expires_time=REFRESH_TOKEN_EXPIRES, user_claims=additional_claims
         )
 
         return refresh_token
@@ -76,14 +129,11 @@ class TokenService:
     async def refresh_access_token(self, authorize: AuthJWT):
         """Обновление access токена с помощью refresh токена"""
         try:
-            # Проверяем, что передан валидный refresh токен
-            await authorize.jwt_refresh_token_required()
+            # Проверяем, что передан валидный refresh токен, и получаем его claims
+            claims = await get_token_claims(authorize, refresh=True)
 
             # Получаем идентификатор пользователя из токена
-            current_user = await authorize.get_jwt_subject()
-
-            # Получаем claims для проверки типа токена
-            claims = await authorize.get_raw_jwt()
+            current_user = claims.get("sub")
 
             # Проверяем, что это действительно refresh токен
             if claims.get("token_type") != "refresh":
@@ -100,37 +150,46 @@ class TokenService:
     async def add_token_in_blacklist(self, authorize: AuthJWT, redis: Redis):
         """Добавляет токен в блэклист"""
 
+        if opaque_mode():
+            # У opaque-токена блэклист не нужен: отзыв — это удаление сессии
+            await revoke_opaque_token(redis, raw_token(authorize))
+            return
+
         jwt_data = await authorize.get_raw_jwt()
         jti = jwt_data.get("jti")  # JWT ID - уникальный идентификатор токена
         exp_timestamp = jwt_data.get("exp")  # Время истечения (timestamp)
         user_id = jwt_data.get("sub")  # id пользователя
         current_time = int(datetime.now().timestamp())
         ttl_seconds = exp_timestamp - current_time
-        blacklist_key = jti
-        await redis.setex(
-            blacklist_key,  # ключ
-            ttl_seconds,  # время хранения
-            user_id,  # значение
-        )
+        await get_revocation_checker().revoke(redis, jti, ttl_seconds, user_id)
 
     async def get_token_from_redis(self, authorize: AuthJWT, redis: Redis):
         """Проверяет есть ли токен в блэклисте"""
 
-        jwt_data = await authorize.get_raw_jwt()
-        if await redis.get(jwt_data.get("jti")):
+        if opaque_mode():
+            # Сессия есть в Redis — значит токен не отозван, иначе get_token_claims ответит 401;
+            # остаётся проверить отзыв всех токенов пользователя (удаление аккаунта)
+            jwt_data = await get_token_claims(authorize)
+        else:
+            jwt_data = await authorize.get_raw_jwt()
+        if await get_revocation_checker().is_revoked(redis, jwt_data.get("jti"), self.fail_open, jwt_data.get("sub")):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пожалуйста пройдите авторизацию")
         return True
 
     def decode_token(token: str) -> dict | None:
         """Функция декодирует токен"""
         try:
-            return jwt.decode(token, settings.authjwt_secret_key, algorithms=[settings.authjwt_algorithm])
+            settings = get_settings()
+            key = settings.authjwt_secret_key
+            if not settings.authjwt_algorithm.startswith("HS"):
+                key = settings.authjwt_public_key
+            return jwt.decode(token, key, algorithms=[settings.authjwt_algorithm])
         except Exception:
             return None
 
 
-def get_token_service(db: AsyncSession = Depends(get_session)) -> TokenService:
-    result = TokenService(db)
+def get_token_service(request: Request, db: AsyncSession = Depends(get_session)) -> TokenService:
+    result = TokenService(db, fail_open=revocation_fail_open(request))
     return result
 
 
@@ -162,7 +221,10 @@ class JWTBearer(HTTPBearer):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid authorization code.")
         if not credentials.scheme == "Bearer":
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Only Bearer token might be accepted")
-        decoded_token = self.parse_token(credentials.credentials)
+        if opaque_mode():
+            decoded_token = await resolve_opaque_token(redis_db.redis, credentials.credentials)
+        else:
+            decoded_token = self.parse_token(credentials.credentials)
         if not decoded_token:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired token.")
         return decoded_token
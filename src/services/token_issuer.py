@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import hmac
+import time
+import uuid
+from functools import lru_cache
+
+import jwt
+import orjson
+
+from src.core.config import get_settings
+
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+class TokenIssuer:
+    """
+    Выпуск JWT с подготовленным заранее состоянием подписи.
+
+    Заголовок кодируется один раз, HMAC-ключ (или приватный ключ для RS/ES/PS) подготавливается
+    один раз на ключ; на каждый токен — только orjson-сериализация claims и подпись.
+    Набор и формат claims совпадают с AuthJWT.create_access_token/create_refresh_token; дополнительно iat_ms —
+    время выпуска в миллисекундах, по нему токен сравнивается с отметкой смены роли.
+    """
+
+    def __init__(self, algorithm: str, key: str):
+        self.algorithm = algorithm
+        header = orjson.dumps({"alg": algorithm, "typ": "JWT"})
+        self._header_segment = _b64encode(header) + b"."
+
+        digest = _HMAC_DIGESTS.get(algorithm)
+        if digest is not None:
+            self._hmac = hmac.new(key.encode(), digestmod=digest)
+        else:
+            self._hmac = None
+            self._algorithm = jwt.get_algorithm_by_name(algorithm)
+            self._key = self._algorithm.prepare_key(key)
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        if self._hmac is not None:
+            mac = self._hmac.copy()
+            mac.update(signing_input)
+            return mac.digest()
+        return self._algorithm.sign(signing_input, self._key)
+
+    def issue(self, subject: str, token_type: str, expires_time: int, user_claims: dict) -> str:
+        now_ms = time.time_ns() // 1_000_000
+        now = now_ms // 1000
+        payload = {
+            "sub": subject,
+            "iat": now,
+            "nbf": now,
+            "jti": str(uuid.uuid4()),
+            "exp": now + expires_time,
+            "iat_ms": now_ms,
+        }
+        payload["type"] = token_type
+        if token_type == "access":
+            payload["fresh"] = False
+        payload.update(user_claims)
+
+        signing_input = self._header_segment + _b64encode(orjson.dumps(payload))
+        return (signing_input + b"." + _b64encode(self._sign(signing_input))).decode()
+
+
+@lru_cache
+def _issuer_for_key(algorithm: str, key: str) -> TokenIssuer:
+    return TokenIssuer(algorithm, key)
+
+
+def get_token_issuer() -> TokenIssuer:
+    """Издатель для текущего ключа из настроек (состояние подписи создаётся один раз на ключ)"""
+    settings = get_settings()
+    key = settings.authjwt_secret_key
+    if settings.authjwt_algorithm not in _HMAC_DIGESTS:
+        key = settings.authjwt_private_key
+    return _issuer_for_key(settings.authjwt_algorithm, key)
@@ -1,23 +1,32 @@
-import dotenv
-import requests
+import asyncio
+
 from async_fastapi_jwt_auth import AuthJWT
 from async_fastapi_jwt_auth.exceptions import AuthJWTException
 from fastapi import Depends, HTTPException, Request
 from fastapi.encoders import jsonable_encoder
 from redis.asyncio import Redis
-from sqlalchemy import select
+from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
 
 from exceptions import UserNotFound, UserInDB
-from src.core.config import Settings
+from src.core.metrics import count_login
 from src.db.postgres import get_session
-from src.models.user import Role, User
+from src.db.queries import (
+    UserRecord,
+    fetch_role_by_name,
+    fetch_user_by_id,
+    fetch_user_by_identifier,
+    login_taken,
+    user_exists,
+)
+from src.models.user import User, hash_password
 from src.schemas.users import UserAuthSchema, UserCreateSchema, UserUpdateSchema
 from src.services.login_history import LoginHistoryService
+from src.services.outbox import USER_CREATED, USER_LOGGED_OUT, add_outbox_event
+from src.services.profile_cache import get_profile_cache
 from src.services.token import TokenService
 
-dotenv.load_dotenv()
-
 
 class UserService:
 
@@ -27,12 +36,13 @@ class UserService:
     async def create_user(self, user_data: UserCreateSchema, role_name: str = "user") -> User:
         """Создание пользователя с ролью по умолчанию"""
 
-        query = await self.db.execute(select(Role).filter(Role.name == role_name))
-        user_role = query.scalar_one_or_none()
+        user_role = await fetch_role_by_name(self.db, role_name)
         if user_data.password != user_data.password_again:
             raise ValueError("Пароли не совпадают")
 
-        user = User(
+        # pbkdf2 считается в потоке, чтобы не блокировать event loop остальным запросам
+        user = await asyncio.to_thread(
+            User,
             login=user_data.login,
             email=user_data.email,
             password=user_data.password,
@@ -40,14 +50,14 @@ class UserService:
             last_name=user_data.last_name,
             role_id=user_role.id,
         )
-        query = await self.db.execute(select(User).filter(User.login == user.login))
-        user_in_db = query.scalar_one_or_none()
-
-        if user_in_db:
+        if await user_exists(self.db, user.login, user.email):
             raise UserInDB("Пользователь с таким логином уже существует")
         self.db.add(user)
+        # flush присваивает id, событие уходит в outbox в той же транзакции
+        await self.db.flush()
+        add_outbox_event(self.db, USER_CREATED, {"user_id": str(user.id), "login": user.login, "role": role_name})
+        # expire_on_commit=False и значения по умолчанию на стороне клиента: перечитывать строку не нужно
         await self.db.commit()
-        await self.db.refresh(user)
         return user
 
     async def auth_user(
@@ -55,20 +65,20 @@ class UserService:
         user_auth: UserAuthSchema,
         request: Request,
         login_history_service: LoginHistoryService,
-    ):
+    ) -> UserRecord:
         """Авторизация пользователя"""
         user_auth_dto = jsonable_encoder(user_auth)
-        query = select(User).where(User.email == str(user_auth_dto["email"]))
-        result = await self.db.execute(query)
-        user = result.scalar_one_or_none()
+        # В поле email можно передать и логин
+        user = await fetch_user_by_identifier(self.db, str(user_auth_dto["email"]))
 
         if user:
-            check_hash_password = user.check_password(user_auth_dto["password"])
+            check_hash_password = await asyncio.to_thread(user.check_password, user_auth_dto["password"])
             if check_hash_password:
                 await login_history_service.create_login_history_from_request(request, user.id)
                 return user
-        elif not user:
-            raise UserNotFound
+            # Неудачный вход только считается в метриках: запись в БД и outbox на каждый перебор пароля не нужна
+            count_login("failure")
+        raise UserNotFound
 
     async def update_user(
         self,
@@ -78,28 +88,38 @@ class UserService:
         authorize: AuthJWT,
         redis: Redis,
         token_service: TokenService,
-    ) -> User:
+    ) -> UserRecord:
         """Обновление данных пользователя"""
 
         await token_service.get_token_from_redis(authorize, redis)
-        user = await self.db.execute(select(User).where(User.id == user_id))
-        user = user.scalar_one_or_none()
+        user = await fetch_user_by_id(self.db, user_id)
         if not user:
             raise UserNotFound("User not found")
 
         if current_user.get("user_id") == str(user.id):
 
             update_dict = update_data.model_dump(exclude_unset=True)
+            values = {}
 
             if "new_password" in update_dict:
-                user.set_password(update_dict["new_password"])
-                del update_dict["new_password"]
+                values["password"] = await asyncio.to_thread(hash_password, update_dict["new_password"])
 
             if "new_login" in update_dict:
-                user.login = update_dict["new_login"]
-
-            await self.db.commit()
-            await self.db.refresh(user)
+                if await login_taken(self.db, update_dict["new_login"], user.id):
+                    raise UserInDB("Пользователь с таким логином уже существует")
+                values["login"] = update_dict["new_login"]
+
+            if values:
+                await self.db.execute(
+                    update(User)
+                    .where(User.id == user.id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                await self.db.commit()
+                await get_profile_cache().invalidate(redis, user.id)
+                for name, value in values.items():
+                    setattr(user, name, value)
         return user
 
     async def logout_user(
@@ -110,31 +130,44 @@ class UserService:
             await token_service.get_token_from_redis(authorize, redis)
             if str(user_id) == current_user.get("user_id"):
                 add_token_blacklist = await token_service.add_token_in_blacklist(authorize, redis)
+                add_outbox_event(self.db, USER_LOGGED_OUT, {"user_id": str(user_id)})
+                await self.db.commit()
             return {"message": "Вы вышли из профиля"}
         except AuthJWTException as e:
             raise HTTPException(status_code=401, detail=f"Ошибка выхода из профиля: {str(e)}")
 
-    async def get_yandex_redirect_url(self):
-        settings = Settings()
-        print(settings.yandex_redirect_url)
-        return settings.yandex_redirect_url
-
-    async def get_user_info(self, code: str) -> dict:
-        settings = Settings()
-        token_url = "https://oauth.yandex.ru/token"
-        data = {
-            "code": code,
-            "client_id": settings.yandex_client_id,
-            "client_secret": settings.yandex_client_secret,
-            "redirect_uri": settings.yandex_redirect_url,
-            "grant_type": "authorization_code",
-        }
-        response = requests.post(token_url, data=data)
-        access_token = response.json()["access_token"]
-        user_info = requests.get("https://login.yandex.ru/info?", headers={"Authorization": f"{access_token}"})
-        return user_info.json()
-
 
 def get_user_service(db: AsyncSession = Depends(get_session)) -> UserService:
     result = UserService(db)
     return result
+
+
+def find_case_duplicates(db: Session) -> dict[str, list[list[User]]]:
+    """Группы пользователей, чьи email или логины совпадают без учёта регистра (мешают уникальным индексам)"""
+    report = {}
+    for name, column in (("email", User.email), ("login", User.login)):
+        duplicated = select(func.lower(column)).group_by(func.lower(column)).having(func.count() > 1)
+        users = db.scalars(
+            select(User).where(func.lower(column).in_(duplicated)).order_by(func.lower(column), User.created_at)
+        )
+        groups: dict[str, list[User]] = {}
+        for user in users:
+            groups.setdefault(getattr(user, name).lower(), []).append(user)
+        report[name] = list(groups.values())
+    return report
+
+
+def lowercase_emails(db: Session, batch_size: int) -> int:
+    """Привести email к нижнему регистру пачками; адреса, которые столкнутся с чужими, пропускаются"""
+    other = aliased(User)
+    collides = select(other.id).where(func.lower(other.email) == func.lower(User.email), other.id != User.id).exists()
+    total = 0
+    while True:
+        batch = select(User.id).where(User.email != func.lower(User.email), ~collides).limit(batch_size)
+        result = db.execute(
+            update(User).where(User.id.in_(batch.scalar_subquery())).values(email=func.lower(User.email))
+        )
+        db.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
@@ -0,0 +1,176 @@
+import re
+from collections import OrderedDict
+from functools import lru_cache
+
+from src.core.config import get_settings
+from src.core.metrics import USER_AGENT_CACHE_HIT, USER_AGENT_CACHE_MISS, USER_AGENT_FAST_PATH
+
+# Быстрый путь для самых частых семейств браузеров: полные UA-строки
+# Chrome/Edge/Firefox/Safari на десктопах, iPhone/iPad и Android.
+# Всё, что не попало сюда, разбирается библиотекой user_agents.
+_FAST_PATH = (
+    (
+        re.compile(
+            r"Mozilla/5\.0 \((?:Windows NT \d+\.\d+; Win64; x64|Macintosh; Intel Mac OS X [\d_]+|X11; Linux x86_64)\) "
+            r"AppleWebKit/537\.36 \(KHTML, like Gecko\) Chrome/[\d.]+ Safari/537\.36(?: Edg/[\d.]+| OPR/[\d.]+)?"
+        ),
+        "desktop",
+    ),
+    (
+        re.compile(
+            r"Mozilla/5\.0 \((?:Windows NT \d+\.\d+; Win64; x64|Macintosh; Intel Mac OS X \d+\.\d+|X11; Linux x86_64)"
+            r"; rv:[\d.]+\) Gecko/20100101 Firefox/[\d.]+"
+        ),
+        "desktop",
+    ),
+    (
+        re.compile(
+            r"Mozilla/5\.0 \(Macintosh; Intel Mac OS X [\d_]+\) AppleWebKit/[\d.]+ \(KHTML, like Gecko\) "
+            r"Version/[\d.]+ Safari/[\d.]+"
+        ),
+        "desktop",
+    ),
+    (
+        re.compile(
+            r"Mozilla/5\.0 \(iPhone; CPU iPhone OS [\d_]+ like Mac OS X\) AppleWebKit/[\d.]+ \(KHTML, like Gecko\) "
+            r"(?:Version|CriOS|FxiOS)/[\d.]+ Mobile/\w+ Safari/[\d.]+"
+        ),
+        "mobile",
+    ),
+    (
+        re.compile(
+            r"Mozilla/5\.0 \(iPad; CPU OS [\d_]+ like Mac OS X\) AppleWebKit/[\d.]+ \(KHTML, like Gecko\) "
+            r"(?:Version|CriOS|FxiOS)/[\d.]+ Mobile/\w+ Safari/[\d.]+"
+        ),
+        "tablet",
+    ),
+    (
+        re.compile(
+            r"Mozilla/5\.0 \(Linux; Android [\d.]+; K\) AppleWebKit/537\.36 \(KHTML, like Gecko\) "
+            r"Chrome/[\d.]+ Mobile Safari/537\.36"
+        ),
+        "mobile",
+    ),
+)
+
+# Семейство браузера и ОС без версий: обновление браузера не должно выглядеть как новое устройство.
+# Порядок важен: Edge, Opera и Яндекс.Браузер тоже содержат "Chrome", а Chrome — "Safari"
+_BROWSERS = (
+    ("edge", re.compile(r"Edg(?:e|A|iOS)?/")),
+    ("opera", re.compile(r"OPR/|Opera")),
+    ("yandex", re.compile(r"YaBrowser/")),
+    ("firefox", re.compile(r"Firefox/|FxiOS/")),
+    ("chrome", re.compile(r"Chrome/|CriOS/")),
+    ("safari", re.compile(r"Safari/")),
+)
+_SYSTEMS = (
+    ("ios", re.compile(r"iPhone|iPad|iPod")),
+    ("android", re.compile(r"Android")),
+    ("windows", re.compile(r"Windows")),
+    ("macos", re.compile(r"Macintosh|Mac OS X")),
+    ("linux", re.compile(r"Linux|X11")),
+)
+
+
+class UserAgentClassifier:
+    """
+    Тип устройства и семейство браузера/ОС по User-Agent с LRU-кэшем по сырой строке заголовка.
+
+    Оба значения вычисляются при промахе и лежат в одной записи кэша: история входов и отпечатки
+    устройства разбирают один и тот же заголовок один раз.
+    """
+
+    def __init__(self, maxsize: int = 1024, fast_path: bool = True):
+        self.maxsize = maxsize
+        self.fast_path = fast_path
+        self._cache: OrderedDict[str, tuple[str, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fast_path_hits = 0
+
+    def classify(self, user_agent: str) -> str:
+        if not user_agent:
+            return "unknown"
+        return self._entry(user_agent)[0]
+
+    def family(self, user_agent: str) -> str:
+        """Браузер и ОС без версий, например chrome/windows"""
+        if not user_agent:
+            return "other/other"
+        return self._entry(user_agent)[1]
+
+    def _entry(self, user_agent: str) -> tuple[str, str]:
+        entry = self._cache.get(user_agent)
+        if entry is not None:
+            self.hits += 1
+            USER_AGENT_CACHE_HIT.inc()
+            self._cache.move_to_end(user_agent)
+            return entry
+
+        self.misses += 1
+        USER_AGENT_CACHE_MISS.inc()
+        entry = self._classify_uncached(user_agent), user_agent_family(user_agent)
+        self._cache[user_agent] = entry
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return entry
+
+    def _classify_uncached(self, user_agent: str) -> str:
+        if self.fast_path:
+            for pattern, device_type in _FAST_PATH:
+                if pattern.fullmatch(user_agent):
+                    self.fast_path_hits += 1
+                    USER_AGENT_FAST_PATH.inc()
+                    return device_type
+        return parse_device_type(user_agent)
+
+    def stats(self) -> dict:
+        """Счётчики этого экземпляра и hit rate (для дашбордов — auth_user_agent_cache_total)"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "fast_path_hits": self.fast_path_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self.hits = self.misses = self.fast_path_hits = 0
+
+
+def user_agent_family(user_agent: str) -> str:
+    browser = next((name for name, pattern in _BROWSERS if pattern.search(user_agent)), "other")
+    system = next((name for name, pattern in _SYSTEMS if pattern.search(user_agent)), "other")
+    return f"{browser}/{system}"
+
+
+def parse_device_type(user_agent: str) -> str:
+    """Полный разбор User-Agent библиотекой user_agents (десятки регулярных выражений)"""
+    # Импорт отложен: загрузка правил ua-parser заметно замедляет старт воркера
+    import user_agents
+
+    try:
+        ua = user_agents.parse(user_agent)
+
+        if ua.is_mobile:
+            return "mobile"
+        elif ua.is_tablet:
+            return "tablet"
+        elif ua.is_pc:
+            return "desktop"
+        elif ua.is_bot:
+            return "bot"
+        else:
+            return "other"
+    except Exception:
+        return "unknown"
+
+
+@lru_cache
+def get_user_agent_classifier() -> UserAgentClassifier:
+    """Один классификатор на процесс воркера"""
+    settings = get_settings()
+    return UserAgentClassifier(maxsize=settings.user_agent_cache_size, fast_path=settings.user_agent_fast_path)
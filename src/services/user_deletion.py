@@ -0,0 +1,89 @@
+import logging
+import time
+import uuid
+from typing import Optional
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from exceptions import AccountNotFound
+from src.db import postgres
+from src.db.postgres import get_session
+from src.models.user import UNUSABLE_PASSWORD, LoginHistory, SocialAccount, User
+from src.services.login_fingerprint import FINGERPRINT_PREFIX
+from src.services.outbox import USER_DELETED, add_outbox_event
+from src.services.profile_cache import queue_profile_invalidation
+from src.services.revocation import get_revocation_checker
+from src.services.role_assignment import ROLE_CHANGED_PREFIX, role_changed_mark
+from src.services.token import ACCESS_TOKEN_EXPIRES, REFRESH_TOKEN_EXPIRES
+
+logger = logging.getLogger(__name__)
+
+
+class UserDeletionService:
+    """
+    Удаление аккаунта без загрузки истории входов в память.
+
+    Сначала одна короткая транзакция закрывает вход (пароль становится непригодным, привязки OAuth удаляются),
+    и отзываются все токены пользователя. Затем история входов удаляется пачками по batch_size строк,
+    каждая в своей транзакции, а строку users удаляет один DELETE: rollup-таблицы удаляет ON DELETE CASCADE.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def lock_out(self, redis: Redis, user_id: uuid.UUID) -> None:
+        """Закрыть вход и отозвать токены; повторный вызов для частично удалённого аккаунта безопасен"""
+        result = await self.db.execute(
+            update(User).where(User.id == user_id).values(password=UNUSABLE_PASSWORD).returning(User.id)
+        )
+        if result.scalar_one_or_none() is None:
+            raise AccountNotFound
+        await self.db.execute(delete(SocialAccount).where(SocialAccount.user_id == user_id))
+        await self.db.commit()
+
+        async with redis.pipeline(transaction=False) as pipe:
+            queue_profile_invalidation(pipe, [user_id])
+            pipe.delete(FINGERPRINT_PREFIX + str(user_id))
+            # roles_required не ходит в блэклист: отметка смены роли отклоняет и токены администратора
+            pipe.set(ROLE_CHANGED_PREFIX + str(user_id), role_changed_mark(), ex=ACCESS_TOKEN_EXPIRES)
+            await pipe.execute()
+        await get_revocation_checker().revoke_user(redis, str(user_id), REFRESH_TOKEN_EXPIRES)
+
+    async def purge(self, user_id: uuid.UUID, batch_size: int, deadline: Optional[float] = None) -> bool:
+        """
+        Удалить историю входов пачками, затем самого пользователя.
+
+        deadline — time.monotonic(), после которого новые пачки не начинаются; False — удаление не закончено.
+        """
+        batch = select(LoginHistory.id).where(LoginHistory.user_id == user_id).limit(batch_size).scalar_subquery()
+        while True:
+            result = await self.db.execute(
+                delete(LoginHistory).where(LoginHistory.id.in_(batch)).execution_options(synchronize_session=False)
+            )
+            await self.db.commit()
+            if result.rowcount < batch_size:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+        await self.db.execute(delete(User).where(User.id == user_id).execution_options(synchronize_session=False))
+        add_outbox_event(self.db, USER_DELETED, {"user_id": str(user_id)})
+        await self.db.commit()
+        logger.info("Пользователь %s удалён", user_id)
+        return True
+
+
+async def finish_deletion(user_id: uuid.UUID, batch_size: int) -> None:
+    """Дочистить тяжёлый аккаунт после ответа (BackgroundTasks): своя сессия, без ограничения по времени"""
+    try:
+        async with postgres.async_session() as db:
+            await UserDeletionService(db).purge(user_id, batch_size)
+    except Exception:
+        logger.exception("Удаление пользователя %s не завершено, дочистите: python cli.py delete-users", user_id)
+
+
+def get_user_deletion_service(db: AsyncSession = Depends(get_session)) -> UserDeletionService:
+    return UserDeletionService(db)
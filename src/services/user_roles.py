@@ -4,10 +4,17 @@ from typing import Callable
 from async_fastapi_jwt_auth import AuthJWT
 from fastapi import Depends, status, HTTPException
 
+from src.db import redis_db
+from src.services.role_assignment import role_changed_since
+from src.services.token import get_token_claims
 
-def roles_required(roles_list: list[str]):
+
+def roles_required(roles_list: list[str], scopes_list: list[str] | None = None):
     """
-    Декоратор для проверки ролей пользователя (версия с JWT claims)
+    Декоратор для проверки ролей пользователя (версия с JWT claims).
+
+    scopes_list открывает маршрут и сервисам: токен client credentials проходит, если в нём есть все scope
+    из списка. Без scopes_list токены сервисов не принимаются.
     """
 
     def decorator(func: Callable):
@@ -15,17 +22,27 @@ def roles_required(roles_list: list[str]):
         async def wrapper(*args, authorize: AuthJWT = Depends(), **kwargs):
             try:
 
-                # Проверяем JWT токен
-                await authorize.jwt_required()
+                # Проверяем токен и получаем его claims
+                jwt_data = await get_token_claims(authorize)
 
-                # Получаем claims из токена
-                jwt_data = await authorize.get_raw_jwt()
+                # Токен сервиса: роли у него нет, права задаются scope
+                if jwt_data.get("client_id"):
+                    granted = set((jwt_data.get("scope") or "").split())
+                    if scopes_list is None or not set(scopes_list) <= granted:
+                        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+                    return await func(*args, authorize=authorize, **kwargs)
 
                 # Проверяем наличие роли в claims
                 user_role = jwt_data.get("role")
                 if not user_role:
                     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Роль не найдена в токене")
 
+                # После смены роли токены с прежней ролью в claims не принимаются
+                if await role_changed_since(redis_db.redis, jwt_data):
+                    raise HTTPException(
+                        status_code=status.HTTP_401_UNAUTHORIZED, detail="Роль изменилась, пройдите авторизацию заново"
+                    )
+
                 # Проверяем разрешенные роли
                 if user_role not in roles_list:
                     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
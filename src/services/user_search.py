@@ -0,0 +1,107 @@
+import base64
+import binascii
+from typing import Optional
+
+import orjson
+from fastapi import Depends
+from sqlalchemy import Select, or_, select, text
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.postgres import get_session
+from src.db.replicas import execute_read
+from src.models.user import Role, User
+
+# Короче трёх символов у триграммы нет ни одного полного элемента — индекс не помогает
+MIN_QUERY_LENGTH = 3
+
+
+def encode_cursor(login: str) -> str:
+    return base64.urlsafe_b64encode(login.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError) as exc:
+        raise ValueError("Некорректный курсор") from exc
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def user_filter(columns: list, query: Optional[str], role: Optional[str]) -> Select:
+    """Пользователи по подстроке логина, email, имени или фамилии и по имени роли"""
+    stmt = select(*columns).select_from(User).join(Role, User.role_id == Role.id)
+    if query:
+        # Каждое условие покрыто своим GIN-индексом gin_trgm_ops, Postgres объединяет их через BitmapOr
+        pattern = f"%{_escape_like(query)}%"
+        stmt = stmt.where(
+            or_(
+                User.login.ilike(pattern),
+                User.email.ilike(pattern),
+                User.first_name.ilike(pattern),
+                User.last_name.ilike(pattern),
+            )
+        )
+    if role:
+        stmt = stmt.where(Role.name == role)
+    return stmt
+
+
+class UserSearchService:
+    """Поиск пользователей для администратора"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def search(
+        self, query: Optional[str], role: Optional[str], limit: int, cursor: Optional[str]
+    ) -> tuple[list[Row], Optional[str], int]:
+        """
+        Страница результатов по возрастанию логина.
+
+        Keyset-пагинация: следующая страница начинается с login > последнего логина предыдущей,
+        поэтому её стоимость не растёт с номером страницы, в отличие от OFFSET.
+        """
+        stmt = user_filter(
+            [
+                User.id,
+                User.login,
+                User.email,
+                User.first_name,
+                User.last_name,
+                Role.name.label("role"),
+                User.created_at,
+            ],
+            query,
+            role,
+        )
+        if cursor:
+            stmt = stmt.where(User.login > decode_cursor(cursor))
+        # Лишняя строка показывает, есть ли следующая страница
+        result = await execute_read(self.db, stmt.order_by(User.login).limit(limit + 1))
+        rows = result.all()
+        next_cursor = encode_cursor(rows[limit - 1].login) if len(rows) > limit else None
+        total = await self.estimate_count(query, role)
+        return rows[:limit], next_cursor, total
+
+    async def estimate_count(self, query: Optional[str], role: Optional[str]) -> int:
+        """Оценка числа найденных: статистика таблицы или план запроса вместо точного COUNT(*)"""
+        if not query and not role:
+            result = await self.db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'users'"))
+            return max(result.scalar_one(), 0)
+
+        connection = await self.db.connection()
+        compiled = user_filter([User.id], query, role).compile(dialect=connection.dialect)
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", params)
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = orjson.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def get_user_search_service(db: AsyncSession = Depends(get_session)) -> UserSearchService:
+    return UserSearchService(db)